@@ -1,25 +1,98 @@
 # Ejemplo conceptual de clasificador con instructor
-import instructor
-from openai import OpenAI
+import re
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional
 from datetime import date
 
 from app.config.settings import *
-
-client = instructor.from_openai(OpenAI(api_key=OPENAI_API_KEY))
+from app.ai.llm_cache import cached_completion
+from app.ai.llm_gateway import PRIORITY_CLASSIFICATION
 
 class DocumentSource(BaseModel):
     source: Literal["Mysteel", "FastMarkets", "Platts", "Baltic", "Other"]
     date: date
 
+# Cabeceras reconocibles de cada fuente (se buscan en el inicio de la primera página)
+SOURCE_PATTERNS = {
+    "Mysteel": re.compile(r"\bmysteel\b", re.IGNORECASE),
+    "FastMarkets": re.compile(r"\bfast\s?markets\b", re.IGNORECASE),
+    "Platts": re.compile(r"\bplatts\b|\bS&P Global Commodity Insights\b", re.IGNORECASE),
+    "Baltic": re.compile(
+        r"\bbaltic\s+(?:exchange|dry\s+index|(?:capesize|panamax|supramax|handysize)(?:\s+index)?)\b|\bbalticexchange\.com\b",
+        re.IGNORECASE,
+    ),
+}
+MASTHEAD_CHARS = 600
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+# Solo formatos sin ambigüedad día/mes
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b"), ("y", "m", "d")),
+    (re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+{_MONTH},?\s+(\d{{4}})\b", re.IGNORECASE), ("d", "mon", "y")),
+    (re.compile(rf"\b{_MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b", re.IGNORECASE), ("mon", "d", "y")),
+    # Formato de columna de tabla: 12-Mar-24, 12-Mar-2024
+    (re.compile(rf"\b(\d{{1,2}})-{_MONTH}-(\d{{2}}|\d{{4}})\b", re.IGNORECASE), ("d", "mon", "y")),
+]
+
+
+def find_dates(text: str) -> list[tuple[int, int, date]]:
+    """Fechas válidas en alguno de los formatos conocidos, como (inicio, fin, fecha), ordenadas por posición."""
+    candidates = []
+    for pattern, order in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            try:
+                month = MONTHS[parts["mon"][:3].lower()] if "mon" in parts else int(parts["m"])
+                year = int(parts["y"]) + (2000 if len(parts["y"]) == 2 else 0)
+                candidates.append((match.start(), match.end(), date(year, month, int(parts["d"]))))
+            except (ValueError, KeyError):
+                continue
+    return sorted(candidates)
+
+
+def _find_date(text: str) -> Optional[date]:
+    """Devuelve la primera fecha válida (por posición en el texto)."""
+    dates = find_dates(text)
+    return dates[0][2] if dates else None
+
+
+def classify_with_rules(text_from_first_page: str) -> Optional[DocumentSource]:
+    """
+    Clasificador determinista por cabecera y formato de fecha. Solo responde cuando
+    una única fuente y una fecha aparecen en la cabecera; si no, devuelve None (y decide el LLM).
+    Una fecha fuera de la cabecera puede ser de una noticia o un contrato, así que no se usa.
+    """
+    masthead = text_from_first_page[:MASTHEAD_CHARS]
+    sources = [source for source, pattern in SOURCE_PATTERNS.items() if pattern.search(masthead)]
+    if len(sources) != 1:
+        return None
+    document_date = _find_date(masthead)
+    if document_date is None:
+        return None
+    return DocumentSource(source=sources[0], date=document_date)
+
+
+def classify_document(text_from_first_page: str) -> DocumentSource:
+    """Clasifica con reglas locales y recurre a gpt-4o-mini solo si no hay confianza suficiente."""
+    classification = classify_with_rules(text_from_first_page)
+    if classification is not None:
+        print(f"⚡ Clasificado por reglas: '{classification.source}' '{classification.date}'")
+        return classification
+    return classify_with_ai(text_from_first_page)
+
+
 def classify_with_ai(text_from_first_page: str) -> DocumentSource:
     """
     Clasifica el texto usando gpt-4o-mini con few-shot-prompting y salida estructurada.
     """
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=DocumentSource,
+        priority=PRIORITY_CLASSIFICATION,
         messages=[
             {"role": "system", "content": "Eres un asistente experto en clasificar reportes. Identifica la fuente y fecha del siguiente texto y responde usando la herramienta proporcionada."},
             {"role": "user", "content": f"Clasifica el siguiente texto: {text_from_first_page}"}
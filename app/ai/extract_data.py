@@ -1,13 +1,13 @@
-
-import instructor
-from openai import OpenAI
 from pydantic import BaseModel, Field
-from typing import List, Optional
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
 from datetime import date
 
 from app.config.settings import *
-
-client = instructor.from_openai(OpenAI(api_key=OPENAI_API_KEY))
+from app.ai.classify import find_dates
+from app.ai.llm_cache import cached_completion
+from app.pipeline.document import ParsedDocument
 
 class PrecioConFecha(BaseModel):
     valor: float = Field(..., description="El valor numérico del precio/inventario.")
@@ -45,7 +45,7 @@ class NoticiasMysteel(BaseModel):
     noticias: List[ResumenNoticia]
 
 def extraer_platts(texto: str) -> DatosPlatts:
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=DatosPlatts,
         messages=[
@@ -62,7 +62,7 @@ Devuelve solo los campos que estén presentes en el texto con su respectiva fech
     )
 
 def extraer_fastmarkets(texto: str) -> DatosFastmarkets:
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=DatosFastmarkets,
         messages=[
@@ -78,7 +78,7 @@ Devuelve solo los campos que estén presentes en el texto con su respectiva fech
     )
 
 def extraer_baltic(texto: str) -> DatosBaltic:
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=DatosBaltic,
         messages=[
@@ -89,7 +89,7 @@ Devuelve solo los campos que estén presentes en el texto con su respectiva fech
     )
 
 def extraer_inventario_mysteel(texto: str) -> DatosInventarioMysteel:
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=DatosInventarioMysteel,
         messages=[
@@ -99,7 +99,7 @@ def extraer_inventario_mysteel(texto: str) -> DatosInventarioMysteel:
     )
 
 def extraer_noticias_mysteel(texto: str) -> NoticiasMysteel:
-    return client.chat.completions.create(
+    return cached_completion(
         model="gpt-4o-mini",
         response_model=NoticiasMysteel,
         messages=[
@@ -108,11 +108,143 @@ def extraer_noticias_mysteel(texto: str) -> NoticiasMysteel:
         ]
     )
 
+# --- Extractores deterministas (regex/tabla) para precios con códigos fijos ---
+
+class ResultadoReglas(NamedTuple):
+    """Resultado del extractor por reglas: el modelo parcial y la confianza (0-1) de cada campo resuelto."""
+    datos: BaseModel
+    confianza: Dict[str, float]
+
+# Etiquetas que identifican cada campo en el texto, y rango plausible de su valor (USD/t)
+PRICE_RULES = {
+    DatosPlatts: {
+        "precio_62_cfr_china": ([r"IODBZ00", r"62\s*%\s*Fe\b.{0,40}?CFR\s*(?:North\s*)?China"], (20, 400)),
+        "precio_65_cfr_china": ([r"65\s*%\s*Fe\b.{0,40}?CFR\s*(?:North\s*)?China"], (20, 400)),
+        "precio_IOMGD00": ([r"IOMGD00"], (20, 400)),
+    },
+    DatosFastmarkets: {
+        "mb_iro_0009": ([r"MB-IRO-0009"], (20, 400)),
+        "mb_iro_0019_viu": ([r"MB-IRO-0019"], (0, 100)),
+    },
+    DatosBaltic: {
+        "c3_tubarao_qingdao": ([r"\bC3\b.{0,40}?Tubar[aã]o.{0,20}?Qingdao", r"Tubar[aã]o\s*(?:to|-|–)\s*Qingdao"], (2, 100)),
+    },
+}
+# Tolerancia vertical (pt) para agrupar palabras de una misma fila de tabla
+LAYOUT_ROW_TOLERANCE = 3
+_NUMBER = re.compile(r"(?<![\w.,/-])(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![\w%]|/\d|[.,]\d)")
+_PERCENT_AFTER = re.compile(r"\s*%")
+_MONTH_NAME = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+_MONTH_AFTER = re.compile(rf"[\s-]*{_MONTH_NAME}(?![a-z])", re.IGNORECASE)
+_MONTH_BEFORE = re.compile(rf"(?<![a-z]){_MONTH_NAME}[\s-]*$", re.IGNORECASE)
+_QUANTITY_AFTER = re.compile(r"\s*(?:mt|t|kt|dwt|wmt|dmt|tonnes?)\b", re.IGNORECASE)
+_YEAR = re.compile(r"(?:19|20)\d{2}")
+_CURRENCY_BEFORE = re.compile(r"(?:US\$|\$|USD)\s*$", re.IGNORECASE)
+_CURRENCY_AFTER = re.compile(r"\s*(?:US\$|\$|USD)?\s*/\s*(?:t|mt|dmt|wmt|dmtu|tonne)\b", re.IGNORECASE)
+
+def _normalize_line(line: str) -> str:
+    return " ".join(line.split())
+
+def _document_lines(document: ParsedDocument) -> list[list[str]]:
+    """
+    Líneas de cada página: las del texto más las filas reconstruidas del layout PyMuPDF (celdas de tabla
+    en una misma fila), sin repetir las que ambas fuentes producen igual (salvo espacios).
+    """
+    with document.fitz() as doc:
+        pages_words = [page.get_text("words") for page in doc]
+    pages = []
+    for text, words in zip(document.page_texts(), pages_words):
+        rows: Dict[int, list] = {}
+        for x0, y0, x1, y1, word, *_ in words:
+            rows.setdefault(round((y0 + y1) / 2 / LAYOUT_ROW_TOLERANCE), []).append((x0, word))
+        layout_rows = [" ".join(word for _, word in sorted(row)) for _, row in sorted(rows.items())]
+        lines = (_normalize_line(line) for line in [*text.splitlines(), *layout_rows])
+        pages.append(list(dict.fromkeys(line for line in lines if line)))
+    return pages
+
+def _price_after(line: str, start: int, valid_range: tuple[float, float]) -> Optional[float]:
+    """
+    Valor de la columna de precio a la derecha de la etiqueta: el primer número que no es parte de
+    una fecha, un porcentaje, una cantidad (160,000 mt) o un año. Solo se acepta si tiene formato de
+    precio (decimales o contexto de moneda) y está en rango; si no, no se busca más a la derecha.
+    """
+    date_spans = [(date_start, date_end) for date_start, date_end, _ in find_dates(line)]
+    for match in _NUMBER.finditer(line, start):
+        token = match.group(1)
+        before, after = line[:match.start()], line[match.end():]
+        if any(date_start <= match.start() < date_end for date_start, date_end in date_spans):
+            continue
+        if _PERCENT_AFTER.match(after):
+            continue
+        # Día de una fecha que no se pudo parsear completa ("12 Mar", "Mar 12")
+        if token.isdigit() and int(token) <= 31 and (_MONTH_AFTER.match(after) or _MONTH_BEFORE.search(before)):
+            continue
+        if _QUANTITY_AFTER.match(after) or _YEAR.fullmatch(token):
+            continue
+        if not ("." in token or _CURRENCY_BEFORE.search(before) or _CURRENCY_AFTER.match(after)):
+            return None
+        value = float(token.replace(",", ""))
+        return value if valid_range[0] <= value <= valid_range[1] else None
+    return None
+
+def extraer_precios_lineas(pages: list[list[str]], response_model: type) -> ResultadoReglas:
+    """
+    Busca los códigos/etiquetas fijos de cada campo en las líneas de cada página y toma el valor de la
+    columna de precio y la fecha de la misma fila. Cada página aporta un voto por par (valor, fecha)
+    distinto, así que la misma fila leída del texto y del layout no se cuenta dos veces. La confianza es
+    la proporción de votos que coinciden con el valor elegido contando un voto en contra implícito:
+    un único acierto queda en 0.5 (no basta para saltarse el LLM) y hacen falta al menos dos páginas
+    de acuerdo para superar FAST_PATH_MIN_CONFIDENCE. Sin fecha en la fila el campo no se resuelve
+    (queda para el LLM).
+    """
+    valores: Dict[str, PrecioConFecha] = {}
+    confianza: Dict[str, float] = {}
+    for field_name, (labels, valid_range) in PRICE_RULES[response_model].items():
+        votos = []
+        for lines in pages:
+            pagina = set()
+            for line in lines:
+                for label in labels:
+                    match = re.search(label, line, re.IGNORECASE)
+                    if match:
+                        value = _price_after(line, match.end(), valid_range)
+                        if value is not None:
+                            fechas = [fecha for _, _, fecha in find_dates(line)]
+                            pagina.add((value, fechas[0] if len(set(fechas)) == 1 else None))
+                        break
+            votos.extend(pagina)
+        if not votos:
+            continue
+        por_valor = Counter(value for value, _ in votos)
+        mas_comun, apariciones = por_valor.most_common(1)[0]
+        fechas = Counter(fecha for value, fecha in votos if value == mas_comun and fecha is not None)
+        if not fechas:
+            continue
+        valores[field_name] = PrecioConFecha(valor=mas_comun, fecha=fechas.most_common(1)[0][0])
+        confianza[field_name] = round(apariciones / (len(votos) + 1), 2)
+    return ResultadoReglas(datos=response_model(**valores), confianza=confianza)
+
+def extraer_precios_reglas(document: ParsedDocument, response_model: type) -> ResultadoReglas:
+    return extraer_precios_lineas(_document_lines(document), response_model)
+
+def extraer_platts_reglas(document: ParsedDocument) -> ResultadoReglas:
+    return extraer_precios_reglas(document, DatosPlatts)
+
+def extraer_fastmarkets_reglas(document: ParsedDocument) -> ResultadoReglas:
+    return extraer_precios_reglas(document, DatosFastmarkets)
+
+def extraer_baltic_reglas(document: ParsedDocument) -> ResultadoReglas:
+    return extraer_precios_reglas(document, DatosBaltic)
+
 EXTRACTORS = {
     "Platts": extraer_platts,
     "FastMarkets": extraer_fastmarkets,
     "Baltic": extraer_baltic,
     # Añadimos las nuevas funciones específicas para tareas
     "extraer_inventario_mysteel": extraer_inventario_mysteel,
-    "extraer_noticias_mysteel": extraer_noticias_mysteel
+    "extraer_noticias_mysteel": extraer_noticias_mysteel,
+    # Extractores deterministas (sin LLM) para los precios con códigos fijos
+    "Platts_reglas": extraer_platts_reglas,
+    "FastMarkets_reglas": extraer_fastmarkets_reglas,
+    "Baltic_reglas": extraer_baltic_reglas
 }
\ No newline at end of file
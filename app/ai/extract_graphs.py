@@ -1,16 +1,14 @@
-import fitz  # PyMuPDF
 import base64
 from typing import Dict, Any, List
 from datetime import date
 
-import instructor
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
 from app.config.settings import *
-
-client = instructor.patch(OpenAI(api_key=OPENAI_API_KEY))
+from app.ai.llm_cache import cached_completion
+from app.ai.llm_gateway import PRIORITY_VISION
+from app.pipeline.document import ParsedDocument
 
 class GraficoAnalizado(BaseModel):
     """Representa el análisis de un único gráfico."""
@@ -23,45 +21,47 @@ class AnalisisDeGraficos(BaseModel):
     graficos: List[GraficoAnalizado]
 
 
-def extraer_graficos_mysteel(pdf_path: str) -> Dict[str, Any]:
+def extraer_graficos_mysteel(document: ParsedDocument) -> Dict[str, Any]:
     """
     Extrae imágenes de gráficos de un PDF, las analiza con IA, y devuelve los datos enriquecidos.
+    Reutiliza el documento PyMuPDF ya abierto en memoria por `ParsedDocument` (con acceso exclusivo
+    solo durante el recorte de imágenes, no durante la llamada al LLM).
     """
     print("--- 🔍 Iniciando extracción de gráficos con PyMuPDF ---")
     
     imagenes_extraidas = []
     try:
-        doc = fitz.open(pdf_path)
+        from fitz import Rect  # PyMuPDF, import perezoso
+
+        with document.fitz() as doc:
         
-        titles = [
-            "Capacity utilization BF & EAF (%)", "Domestic Iron Ore Mines Operation",
-            "Weekly Imported Iron Ore Volume (10,000t)", "Ports & Steel Mills Inventories (10,000t)",
-            "Blast Furnace Iron Ore Burden Ratio (%)", "Coke Inventory & Capacity Utilization"
-        ]
+            titles = [
+                "Capacity utilization BF & EAF (%)", "Domestic Iron Ore Mines Operation",
+                "Weekly Imported Iron Ore Volume (10,000t)", "Ports & Steel Mills Inventories (10,000t)",
+                "Blast Furnace Iron Ore Burden Ratio (%)", "Coke Inventory & Capacity Utilization"
+            ]
         
-        title_positions = []
-        for page_num, page in enumerate(doc):
-            for title in titles:
-                found = page.search_for(title)
-                if found:
-                    title_positions.append({"title": title, "page": page_num, "y": found[0].y0})
+            title_positions = []
+            for page_num, page in enumerate(doc):
+                for title in titles:
+                    found = page.search_for(title)
+                    if found:
+                        title_positions.append({"title": title, "page": page_num, "y": found[0].y0})
 
-        title_positions = sorted(title_positions, key=lambda x: (x["page"], x["y"]))
+            title_positions = sorted(title_positions, key=lambda x: (x["page"], x["y"]))
 
-        for i, current_title in enumerate(title_positions):
-            page = doc[current_title["page"]]
-            y0 = current_title["y"]
-            y1 = next((t["y"] for t in title_positions[i+1:] if t["page"] == current_title["page"]), page.rect.height)
+            for i, current_title in enumerate(title_positions):
+                page = doc[current_title["page"]]
+                y0 = current_title["y"]
+                y1 = next((t["y"] for t in title_positions[i+1:] if t["page"] == current_title["page"]), page.rect.height)
             
-            clip_area = fitz.Rect(0, y0 - 10, page.rect.width, y1 - 10)
-            pix = page.get_pixmap(clip=clip_area, dpi=200)
+                clip_area = Rect(0, y0 - 10, page.rect.width, y1 - 10)
+                pix = page.get_pixmap(clip=clip_area, dpi=200)
             
-            imagenes_extraidas.append({
-                "pagina": current_title["page"] + 1,
-                "contenido": pix.tobytes("png")
-            })
-        
-        doc.close()
+                imagenes_extraidas.append({
+                    "pagina": current_title["page"] + 1,
+                    "contenido": pix.tobytes("png")
+                })
     except Exception as e:
         print(f"❌ Error durante la extracción de imágenes con PyMuPDF: {e}")
         return {"graficos": []}
@@ -73,9 +73,10 @@ def extraer_graficos_mysteel(pdf_path: str) -> Dict[str, Any]:
     print(f"🖼️  Extraídas {len(imagenes_extraidas)} imágenes de gráficos. Enviando a IA para análisis...")
 
     try:
-        response = client.chat.completions.create(
+        response = cached_completion(
             model="gpt-4o-mini",
             response_model=AnalisisDeGraficos,
+            priority=PRIORITY_VISION,
             messages=[
                 {
                     "role": "system",
@@ -1,16 +1,12 @@
+from app.pipeline.document import ParsedDocument
 
-from PyPDF2 import PdfReader
-
-def extract_first_page_text(pdf_path: str) -> str:
-    reader = PdfReader(pdf_path)
-    
-    if not reader.pages:
+def extract_first_page_text(document: ParsedDocument) -> str:
+    if not document.page_count:
         raise ValueError("El PDF no contiene páginas.")
     
-    first_page = reader.pages[0]
-    text = first_page.extract_text()
+    text = document.page_text(0)
     
     if not text:
         raise ValueError("No se pudo extraer texto de la primera página.")
     
-    return text.strip()
\ No newline at end of file
+    return text
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.config.settings import *
+from app.ai.llm_gateway import PRIORITY_EXTRACTION, llm_gateway
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class LLMCache:
+    """
+    Caché persistente (SQLite) de respuestas LLM ya validadas, direccionada por contenido:
+    la clave es el hash de modelo + esquema del response_model + mensajes. Expira por TTL y
+    desaloja por LRU cuando el tamaño total supera `max_bytes`. El tamaño total se lleva en
+    memoria (se calcula una vez al abrir) y las expiradas se barren cada `SWEEP_EVERY` escrituras.
+    """
+    SWEEP_EVERY = 100
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl_seconds: int = LLM_CACHE_TTL_SECONDS, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._writes = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    schema_name TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at);")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache;").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, response_model: Type[BaseModel], messages: List[Dict[str, Any]]) -> str:
+        payload = json.dumps(
+            {"model": model, "schema": response_model.model_json_schema(), "messages": messages},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, response_model: Type[T]) -> Optional[T]:
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?;", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if time.time() - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?;", (key,))
+                self._total_bytes -= len(value)
+                conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?;", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+        return response_model.model_validate_json(value)
+
+    def set(self, key: str, model: str, result: BaseModel):
+        value = result.model_dump_json()
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            previous = conn.execute("SELECT size FROM llm_cache WHERE key = ?;", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, schema_name, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?);",
+                (key, model, type(result).__name__, value, len(value), now, now),
+            )
+            self._total_bytes += len(value) - (previous[0] if previous else 0)
+            self._writes += 1
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Borra periódicamente las expiradas y, si se supera el tamaño máximo, las menos usadas recientemente."""
+        if self._writes % self.SWEEP_EVERY == 0:
+            cutoff = time.time() - self.ttl_seconds
+            expired = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache WHERE created_at < ?;", (cutoff,)).fetchone()[0]
+            if expired:
+                conn.execute("DELETE FROM llm_cache WHERE created_at < ?;", (cutoff,))
+                self._total_bytes -= expired
+        if self._total_bytes <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC;"):
+            if self._total_bytes - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?;", victims)
+        self._total_bytes -= freed
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "bytes": self._total_bytes,
+        }
+
+
+llm_cache = LLMCache()
+
+
+def cached_completion(*, model: str, response_model: Type[T], messages: List[Dict[str, Any]],
+                      priority: int = PRIORITY_EXTRACTION, **kwargs) -> T:
+    """
+    Llama al modelo a través del gateway LLM compartido: si la misma llamada
+    (modelo, esquema y mensajes idénticos) ya se resolvió, devuelve el resultado guardado.
+    """
+    if not llm_cache.enabled:
+        return llm_gateway.complete(model=model, response_model=response_model, messages=messages, priority=priority, **kwargs)
+
+    key = LLMCache.make_key(model, response_model, messages)
+    try:
+        cached = llm_cache.get(key, response_model)
+    except Exception as e:
+        print(f"⚠️ Error leyendo la caché LLM, se llama al modelo: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    result = llm_gateway.complete(model=model, response_model=response_model, messages=messages, priority=priority, **kwargs)
+    try:
+        llm_cache.set(key, model, result)
+    except Exception as e:
+        print(f"⚠️ Error guardando en la caché LLM: {e}")
+    return result
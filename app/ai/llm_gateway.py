@@ -0,0 +1,295 @@
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.config.settings import *
+from app.pipeline.tokens import count_tokens
+
+T = TypeVar("T", bound=BaseModel)
+
+# Prioridades del scheduler: menor número = se despacha antes
+PRIORITY_CLASSIFICATION = 0
+PRIORITY_EXTRACTION = 1
+PRIORITY_VISION = 2
+
+# Estimación gruesa de tokens por imagen enviada al modelo de visión
+IMAGE_TOKENS_ESTIMATE = 1000
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], expected_output: int = LLM_EXPECTED_OUTPUT_TOKENS) -> int:
+    """Estimación de los tokens que consumirá una llamada (prompt tokenizado + salida esperada), para el presupuesto TPM."""
+    total = expected_output
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [content]
+        for part in parts:
+            if isinstance(part, str):
+                total += count_tokens(part)
+            elif isinstance(part, dict) and part.get("type") == "image_url":
+                total += IMAGE_TOKENS_ESTIMATE
+            elif isinstance(part, dict) and isinstance(part.get("text"), str):
+                total += count_tokens(part["text"])
+    return total
+
+
+class TokenBucket:
+    """Token bucket que se rellena continuamente a `per_minute` unidades por minuto."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` unidades disponibles (0 si ya las hay)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _LLMRequest:
+    def __init__(self, model: str, response_model: Type[BaseModel], messages: List[Dict[str, Any]], kwargs: Dict[str, Any], tokens: int, priority: int):
+        self.model = model
+        self.response_model = response_model
+        self.messages = messages
+        self.kwargs = kwargs
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.future: Future = Future()
+
+
+class LLMGateway:
+    """
+    Cliente LLM compartido por el clasificador, los extractores y el analizador de gráficos.
+    Usa un único AsyncOpenAI (vía instructor) en un event loop propio y despacha las llamadas
+    por prioridad respetando presupuestos de peticiones y tokens por minuto (token buckets)
+    y un máximo de llamadas simultáneas. Los hilos del pipeline lo usan de forma síncrona con `complete`.
+    """
+
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE, tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._wait_stats: Dict[int, Dict[str, float]] = {}
+        self._in_flight = 0
+        self._dropped = 0
+        # Peticiones cuyo Future aún no se resolvió (para fallarlas si el gateway se cierra)
+        self._pending: set[_LLMRequest] = set()
+
+    # --- Ciclo de vida del event loop ---
+    def start(self):
+        """Arranca el event loop y el cliente compartido por adelantado (fase de warm-up)."""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            startup: Dict[str, BaseException] = {}
+
+            def _run():
+                loop = None
+                try:
+                    # Import perezoso: instructor/openai solo se cargan al arrancar el gateway (warm-up o primera llamada)
+                    import instructor
+                    from openai import AsyncOpenAI
+
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    self._client = instructor.from_openai(AsyncOpenAI(api_key=OPENAI_API_KEY))
+                    self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+                    self._slots = asyncio.Semaphore(self.max_concurrency)
+                    self._rpm = TokenBucket(self.requests_per_minute)
+                    self._tpm = TokenBucket(self.tokens_per_minute)
+                    self._dispatcher = loop.create_task(self._dispatch())
+                    self._loop = loop
+                except BaseException as e:
+                    startup["error"] = e
+                    if loop is not None:
+                        loop.close()
+                    return
+                finally:
+                    # Siempre despierta al llamador, también si el arranque falló (p. ej. sin API key)
+                    ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name="llm-gateway", daemon=True)
+            self._thread.start()
+            ready.wait()
+            if "error" in startup:
+                self._thread = None
+                raise RuntimeError(f"No se pudo iniciar el gateway LLM: {startup['error']}") from startup["error"]
+
+    def close(self):
+        if self._loop is None:
+            return
+        loop = self._loop
+        loop.call_soon_threadsafe(self._dispatcher.cancel)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=10)
+        self._loop = None
+        # Las peticiones encoladas o en curso no se completarán: sus llamadores no deben quedar bloqueados
+        with self._stats_lock:
+            pending, self._pending = self._pending, set()
+        for request in pending:
+            try:
+                request.future.set_exception(RuntimeError("El gateway LLM se cerró antes de completar la llamada"))
+            except InvalidStateError:
+                pass
+
+    # --- Scheduler ---
+    async def _dispatch(self):
+        while True:
+            _, _, request = await self._queue.get()
+            # El llamador pudo desistir (timeout/cancelación) mientras esperaba en la cola
+            if request.future.done():
+                self._record_dropped()
+                continue
+            await self._slots.acquire()
+            while not request.future.done():
+                wait = max(self._rpm.wait_time(1), self._tpm.wait_time(request.tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            # Marca la petición como en curso; a partir de aquí `cancel` ya no la descarta
+            if request.future.done() or not request.future.set_running_or_notify_cancel():
+                self._slots.release()
+                self._record_dropped()
+                continue
+            self._rpm.consume(1)
+            self._tpm.consume(request.tokens)
+            self._record_wait(request.priority, time.monotonic() - request.enqueued_at)
+            asyncio.get_running_loop().create_task(self._execute(request))
+
+    async def _execute(self, request: _LLMRequest):
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            result, completion = await self._client.chat.completions.create_with_completion(
+                model=request.model,
+                response_model=request.response_model,
+                messages=request.messages,
+                **request.kwargs,
+            )
+            usage = getattr(completion, "usage", None)
+            if usage is not None and usage.total_tokens is not None:
+                # Ajustamos el bucket con el consumo real en vez de la estimación
+                delta = usage.total_tokens - request.tokens
+                if delta > 0:
+                    self._tpm.consume(delta)
+                else:
+                    self._tpm.refund(-delta)
+            if not request.future.done():  # `close` pudo haberla fallado ya
+                request.future.set_result(result)
+        except BaseException as e:
+            if not request.future.done():
+                try:
+                    request.future.set_exception(e)
+                except InvalidStateError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _record_dropped(self):
+        with self._stats_lock:
+            self._dropped += 1
+
+    def _record_wait(self, priority: int, seconds: float):
+        with self._stats_lock:
+            stats = self._wait_stats.setdefault(priority, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            stats["count"] += 1
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+
+    # --- API pública ---
+    def submit(self, *, model: str, response_model: Type[T], messages: List[Dict[str, Any]],
+               priority: int = PRIORITY_EXTRACTION, **kwargs) -> Future:
+        """Encola una llamada y devuelve un Future (thread-safe) con el resultado validado."""
+        self._ensure_started()
+        request = _LLMRequest(model, response_model, messages, kwargs, estimate_tokens(messages), priority)
+        with self._stats_lock:
+            self._pending.add(request)
+        request.future.add_done_callback(lambda _: self._discard_pending(request))
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (priority, next(self._seq), request))
+        return request.future
+
+    def _discard_pending(self, request: _LLMRequest):
+        with self._stats_lock:
+            self._pending.discard(request)
+
+    def complete(self, *, model: str, response_model: Type[T], messages: List[Dict[str, Any]],
+                 priority: int = PRIORITY_EXTRACTION, result_timeout: Optional[float] = LLM_RESULT_TIMEOUT, **kwargs) -> T:
+        """
+        Versión síncrona de `submit` para los hilos del pipeline. Espera como máximo `result_timeout`
+        segundos (cola + rate limit + llamada) y lanza TimeoutError si se supera. Una petición que
+        aún no se despachó se cancela, para que no consuma presupuesto ni haga la llamada.
+        """
+        future = self.submit(model=model, response_model=response_model, messages=messages, priority=priority, **kwargs)
+        try:
+            return future.result(timeout=result_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"La llamada LLM ({model}) no terminó en {result_timeout}s") from None
+
+    async def acomplete(self, *, model: str, response_model: Type[T], messages: List[Dict[str, Any]],
+                        priority: int = PRIORITY_EXTRACTION, **kwargs) -> T:
+        """Versión awaitable de `submit` para código async (en cualquier event loop)."""
+        future = self.submit(model=model, response_model=response_model, messages=messages, priority=priority, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas del scheduler: tiempo de espera en cola por prioridad y llamadas en curso."""
+        with self._stats_lock:
+            queue_wait = {
+                str(priority): {
+                    "count": int(s["count"]),
+                    "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 1),
+                }
+                for priority, s in sorted(self._wait_stats.items())
+            }
+            return {
+                "in_flight": self._in_flight,
+                "dropped": self._dropped,
+                "queued": self._queue.qsize() if self._loop is not None else 0,
+                "queue_wait": queue_wait,
+            }
+
+
+llm_gateway = LLMGateway()
@@ -9,5 +9,106 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres")
+POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+POSTGRES_POOL_PING_INTERVAL = float(os.getenv("POSTGRES_POOL_PING_INTERVAL", "30"))
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+
+# Ingesta asíncrona por jobs
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", "50"))
+JOBS_MAX_RETAINED = int(os.getenv("JOBS_MAX_RETAINED", "500"))
+
+# Concurrencia de tareas del TASK_REGISTRY por documento
+TASK_CONCURRENCY = int(os.getenv("TASK_CONCURRENCY", "4"))
+
+# Buffer de logs de procesamiento/tareas
+LOG_BUFFER_MAX = int(os.getenv("LOG_BUFFER_MAX", "10000"))
+LOG_FLUSH_BATCH = int(os.getenv("LOG_FLUSH_BATCH", "200"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2.0"))
+
+# Embeddings
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+# Configuración de colecciones Qdrant
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "true").lower() == "true"
+QDRANT_SCALAR_QUANTIZATION = os.getenv("QDRANT_SCALAR_QUANTIZATION", "false").lower() == "true"
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", "0.99"))
+
+# Subidas en streaming y umbral para mantener el PDF en memoria (por encima se vuelca a disco)
+PDF_IN_MEMORY_MAX_BYTES = int(os.getenv("PDF_IN_MEMORY_MAX_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Motor de extracción de texto ("pypdf2" o "pymupdf") y paralelismo por páginas
+TEXT_ENGINE = os.getenv("TEXT_ENGINE", "pypdf2")
+TEXT_PARALLEL_MIN_PAGES = int(os.getenv("TEXT_PARALLEL_MIN_PAGES", "40"))
+TEXT_PARALLEL_WORKERS = int(os.getenv("TEXT_PARALLEL_WORKERS", "0"))  # 0 = sin process pool
+# Los workers no se crean con fork: el proceso de la API tiene hilos (ingesta, gateway, LogSink) con locks tomados
+TEXT_PARALLEL_START_METHOD = os.getenv("TEXT_PARALLEL_START_METHOD", "forkserver")
+
+# Directorio de datos persistentes de la app (cachés SQLite). En Docker es un volumen (ver docker-compose.yml)
+DATA_DIR = os.getenv("DATA_DIR", "/var/lib/cmp")
+
+# Caché persistente de llamadas LLM
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(90 * 24 * 3600)))
+
+# Gateway LLM compartido: límites de tasa y concurrencia
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512"))
+LLM_RESULT_TIMEOUT = float(os.getenv("LLM_RESULT_TIMEOUT", "300"))  # espera máxima de `complete` (cola incluida)
+
+# Confianza mínima para aceptar un campo del extractor por reglas sin consultar al LLM
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.6"))
+
+# Ensamblado de contexto para las tareas de extracción
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")  # Codificación de gpt-4o / gpt-4o-mini
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))
+
+# Chunking para indexación ("page", "tokens" o "blocks")
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "tokens")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "240"))  # tokens del modelo de embeddings (≤ EMBEDDING_MAX_SEQ_LENGTH - 2)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# Caché persistente de embeddings de chunks
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # bytes de vectores (~1.5 KB c/u a 384 dims)
+
+# Motor de embeddings ("torch", "onnx" u "onnx-int8") e inferencia micro-batch
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "")  # vacío = según las instrucciones de la CPU
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_INTRA_OP_THREADS = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", "0"))  # 0 = valor por defecto del runtime
+
+# Servicio de embeddings fuera de proceso (EMBEDDING_BACKEND="remote")
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "/tmp/cmp-embeddings.sock")
+EMBEDDING_SERVER_BACKEND = os.getenv("EMBEDDING_SERVER_BACKEND", "torch")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "60"))
+
+# Warm-up en segundo plano al iniciar (readiness en /health y /ready)
+WARMUP_RETRY_AFTER_SECONDS = int(os.getenv("WARMUP_RETRY_AFTER_SECONDS", "5"))
+WARMUP_STEP_ATTEMPTS = int(os.getenv("WARMUP_STEP_ATTEMPTS", "5"))  # intentos por paso antes de marcar el warm-up como fallido
+WARMUP_BACKOFF_SECONDS = float(os.getenv("WARMUP_BACKOFF_SECONDS", "2"))
+WARMUP_BACKOFF_MAX_SECONDS = float(os.getenv("WARMUP_BACKOFF_MAX_SECONDS", "30"))
+
+# Ingesta incremental por página: reutiliza los puntos de las páginas sin cambios respecto al reporte anterior de la fuente
+PAGE_DELTA_ENABLED = os.getenv("PAGE_DELTA_ENABLED", "true").lower() == "true"
@@ -0,0 +1,68 @@
+"""
+Compara los motores de extracción de texto sobre uno o más PDFs.
+
+Uso:
+    python -m app.pipeline.benchmark_text_engines reporte1.pdf [reporte2.pdf ...] [--workers N]
+
+Para cada motor reporta páginas por segundo; para cada PDF reporta cuántas páginas
+producen exactamente el mismo texto (normalizando espacios) y la similitud media.
+"""
+import argparse
+import difflib
+import re
+import time
+
+from app.pipeline.document import ParsedDocument
+from app.pipeline.text_engines import PyMuPDFEngine, PyPDF2Engine
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _run_engine(engine, path: str) -> tuple[list[str], float]:
+    document = ParsedDocument.from_path(path)
+    document.text_engine = engine
+    try:
+        start = time.perf_counter()
+        pages = document.page_texts()
+        return pages, time.perf_counter() - start
+    finally:
+        document.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de extracción de texto PDF")
+    parser.add_argument("pdfs", nargs="+", help="Rutas de los PDFs a comparar")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos para la extracción paralela de PyMuPDF (0 = secuencial)")
+    parser.add_argument("--min-pages", type=int, default=1, help="Páginas mínimas para activar la extracción paralela")
+    args = parser.parse_args()
+
+    engines = [PyPDF2Engine(), PyMuPDFEngine(parallel_workers=args.workers, parallel_min_pages=args.min_pages)]
+    totales = {engine.name: {"paginas": 0, "segundos": 0.0} for engine in engines}
+
+    for path in args.pdfs:
+        resultados = {}
+        for engine in engines:
+            pages, elapsed = _run_engine(engine, path)
+            resultados[engine.name] = pages
+            totales[engine.name]["paginas"] += len(pages)
+            totales[engine.name]["segundos"] += elapsed
+            print(f"{path} [{engine.name}]: {len(pages)} páginas en {elapsed:.2f}s ({len(pages) / max(elapsed, 1e-9):.1f} pág/s)")
+
+        base, candidato = resultados["pypdf2"], resultados["pymupdf"]
+        pares = list(zip(base, candidato))
+        iguales = sum(1 for a, b in pares if _normalize(a) == _normalize(b))
+        similitud = sum(difflib.SequenceMatcher(None, _normalize(a), _normalize(b)).ratio() for a, b in pares) / max(len(pares), 1)
+        print(f"{path}: {iguales}/{len(pares)} páginas con texto idéntico, similitud media {similitud:.3f}")
+
+    print("\n--- Totales ---")
+    for name, total in totales.items():
+        print(f"{name}: {total['paginas']} páginas, {total['paginas'] / max(total['segundos'], 1e-9):.1f} pág/s")
+
+    for engine in engines:
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
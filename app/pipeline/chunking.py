@@ -0,0 +1,113 @@
+import re
+from typing import Any, Dict, List
+
+from app.config.settings import *
+from app.pipeline.tokens import embedding_token_offsets
+
+# Separación entre bloques de layout (párrafos) en el texto de una página
+_BLOCK_SEPARATOR = re.compile(r"\n\s*\n")
+_LINE_SEPARATOR = re.compile(r"\n")
+# Tokens que el modelo de embeddings añade siempre ([CLS] y [SEP]) y que consumen EMBEDDING_MAX_SEQ_LENGTH
+_SPECIAL_TOKENS = 2
+
+
+def _chunk(content: str, page: int, char_start: int, char_end: int) -> Dict[str, Any]:
+    return {"content": content, "page": page, "char_start": char_start, "char_end": char_end}
+
+
+def _window_limit(max_tokens: int) -> int:
+    """Un chunk nunca supera lo que el modelo de embeddings lee antes de truncar."""
+    return max(1, min(max_tokens, EMBEDDING_MAX_SEQ_LENGTH - _SPECIAL_TOKENS))
+
+
+def _spans(text: str, separator: re.Pattern, start: int, end: int) -> List[tuple]:
+    """Tramos no vacíos de text[start:end] entre separadores, como offsets absolutos."""
+    spans = []
+    position = start
+    for match in list(separator.finditer(text, start, end)) + [None]:
+        span_end = match.start() if match else end
+        if text[position:span_end].strip():
+            spans.append((position, span_end))
+        position = match.end() if match else end
+    return spans
+
+
+def token_windows(text: str, page: int, base_offset: int = 0, max_tokens: int = CHUNK_MAX_TOKENS,
+                  overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
+    """
+    Divide un texto en ventanas de `max_tokens` tokens del modelo de embeddings con `overlap` tokens
+    de solapamiento, conservando offsets. Así ninguna ventana se trunca al codificarla.
+    """
+    max_tokens = _window_limit(max_tokens)
+    offsets = embedding_token_offsets(text)
+    if len(offsets) <= max_tokens:
+        return [_chunk(text.strip(), page, base_offset, base_offset + len(text))] if text.strip() else []
+
+    step = max(1, max_tokens - min(overlap, max_tokens - 1))
+    chunks = []
+    for start in range(0, len(offsets), step):
+        end = min(start + max_tokens, len(offsets))
+        char_start = offsets[start][0]
+        char_end = offsets[end][0] if end < len(offsets) else len(text)
+        content = text[char_start:char_end].strip()
+        if content:
+            chunks.append(_chunk(content, page, base_offset + char_start, base_offset + char_end))
+        if end == len(offsets):
+            break
+    return chunks
+
+
+def block_chunks(text: str, page: int, max_tokens: int = CHUNK_MAX_TOKENS,
+                 overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
+    """
+    Agrupa los bloques de layout de una página hasta `max_tokens`. Un bloque es un párrafo separado
+    por líneas en blanco; como el texto de PyPDF2 rara vez las trae, un párrafo que no cabe se parte
+    en líneas (las filas de una tabla quedan enteras) y solo una línea que no cabe sola se divide en
+    ventanas de tokens.
+    """
+    max_tokens = _window_limit(max_tokens)
+    units = []
+    for paragraph in _spans(text, _BLOCK_SEPARATOR, 0, len(text)):
+        paragraph_tokens = len(embedding_token_offsets(text[paragraph[0]:paragraph[1]]))
+        if paragraph_tokens <= max_tokens:
+            units.append((*paragraph, paragraph_tokens))
+            continue
+        for line in _spans(text, _LINE_SEPARATOR, *paragraph):
+            units.append((*line, len(embedding_token_offsets(text[line[0]:line[1]]))))
+
+    chunks = []
+    current_start, current_end, current_tokens = None, None, 0
+    for unit_start, unit_end, unit_tokens in units:
+        if current_start is not None and current_tokens + unit_tokens <= max_tokens:
+            current_end, current_tokens = unit_end, current_tokens + unit_tokens
+            continue
+        if current_start is not None:
+            chunks.append(_chunk(text[current_start:current_end].strip(), page, current_start, current_end))
+            current_start = None
+        if unit_tokens > max_tokens:
+            chunks.extend(token_windows(text[unit_start:unit_end], page, unit_start, max_tokens, overlap))
+        else:
+            current_start, current_end, current_tokens = unit_start, unit_end, unit_tokens
+    if current_start is not None:
+        chunks.append(_chunk(text[current_start:current_end].strip(), page, current_start, current_end))
+    return chunks
+
+
+def chunk_pages(page_texts: List[str], strategy: str = CHUNK_STRATEGY) -> List[Dict[str, Any]]:
+    """
+    Convierte el texto por página en chunks para indexar. Cada chunk lleva su página (1-indexada)
+    y los offsets de caracteres dentro del texto de esa página.
+    """
+    chunks = []
+    for page_num, text in enumerate(page_texts, start=1):
+        if not text:
+            continue
+        if strategy == "page":
+            chunks.append(_chunk(text, page_num, 0, len(text)))
+        elif strategy == "tokens":
+            chunks.extend(token_windows(text, page_num))
+        elif strategy == "blocks":
+            chunks.extend(block_chunks(text, page_num))
+        else:
+            raise ValueError(f"Estrategia de chunking desconocida: '{strategy}'")
+    return chunks
@@ -0,0 +1,65 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+from app.config.settings import *
+from app.pipeline.tokens import count_tokens, truncate_to_tokens
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+SHINGLE_SIZE = 5
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def build_context(hits: List[Dict[str, Any]], max_tokens: int = CONTEXT_MAX_TOKENS,
+                  dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> Tuple[str, Dict[str, int]]:
+    """
+    Arma el contexto de una tarea a partir de los hits de búsqueda:
+    ordena por score, descarta chunks casi duplicados (Jaccard de shingles de palabras)
+    y empaqueta en orden de score hasta `max_tokens` tokens reales del modelo.
+    Devuelve el contexto y estadísticas (incluidos los tokens efectivamente enviados).
+    """
+    ordered = sorted((hit for hit in hits if hit.get("content")), key=lambda hit: hit.get("score", 0.0), reverse=True)
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+
+    selected: List[str] = []
+    selected_shingles: List[set] = []
+    used_tokens = 0
+    stats = {"chunks_candidatos": len(ordered), "chunks_duplicados": 0, "chunks_fuera_de_presupuesto": 0}
+
+    for hit in ordered:
+        content = hit["content"]
+        shingles = _shingles(content)
+        if any(_jaccard(shingles, previous) >= dedup_threshold for previous in selected_shingles):
+            stats["chunks_duplicados"] += 1
+            continue
+
+        cost = count_tokens(content) + (separator_tokens if selected else 0)
+        if used_tokens + cost > max_tokens:
+            remaining = max_tokens - used_tokens - (separator_tokens if selected else 0)
+            if selected or remaining <= 0:
+                # Puede que un chunk posterior (más corto) sí quepa
+                stats["chunks_fuera_de_presupuesto"] += 1
+                continue
+            # El mejor chunk no cabe entero: lo recortamos para no enviar un contexto vacío
+            content = truncate_to_tokens(content, remaining)
+            cost = count_tokens(content)
+
+        selected.append(content)
+        selected_shingles.append(shingles)
+        used_tokens += cost
+
+    contexto = CONTEXT_SEPARATOR.join(selected)
+    stats["chunks_usados"] = len(selected)
+    stats["tokens_contexto"] = count_tokens(contexto)
+    return contexto, stats
@@ -0,0 +1,196 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Union
+
+from app.config.settings import *
+from app.pipeline.text_engines import TextEngine, get_text_engine
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# PyMuPDF no es thread-safe (ni siquiera entre documentos distintos): todo uso dentro del proceso se serializa
+_FITZ_LOCK = threading.RLock()
+
+
+class ParsedDocument:
+    """
+    Representa un PDF subido, parseado una sola vez por petición.
+    Guarda el contenido original en memoria (bytes o memoryview) o, si supera
+    PDF_IN_MEMORY_MAX_BYTES, en un archivo temporal propio; su hash SHA-256;
+    y cachea de forma perezosa el texto de cada página (con el motor de texto
+    configurado, ver `text_engines`) y el documento PyMuPDF (layout), que solo
+    se usa a través de `fitz()`.
+    """
+
+    def __init__(self, data: BytesLike, nombre_archivo: str, sha256: Optional[str] = None, text_engine: Optional[str] = None):
+        self._data: Optional[BytesLike] = data
+        self.path: Optional[str] = None
+        self.nombre_archivo = nombre_archivo
+        self.hash = sha256 or hashlib.sha256(data).hexdigest()
+        self.size = len(data) if not isinstance(data, memoryview) else data.nbytes
+        self._reader = None
+        self._reader_stream: Optional[BinaryIO] = None
+        self._page_texts: dict[int, str] = {}
+        self._fitz_doc = None
+        self.text_engine: TextEngine = get_text_engine(text_engine)
+        # Las tareas de un documento pueden ejecutarse en paralelo: protege la inicialización perezosa
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_bytes(cls, data: BytesLike, nombre_archivo: str, sha256: Optional[str] = None) -> "ParsedDocument":
+        """Mantiene el documento en memoria salvo que supere el umbral, en cuyo caso se vuelca a disco."""
+        size = len(data) if not isinstance(data, memoryview) else data.nbytes
+        if size <= PDF_IN_MEMORY_MAX_BYTES:
+            return cls(data, nombre_archivo, sha256=sha256)
+        buffer = SpillBuffer(threshold=0)
+        buffer.write(data)
+        return buffer.to_document(nombre_archivo, sha256 or hashlib.sha256(data).hexdigest())
+
+    @classmethod
+    def from_path(cls, path: str, nombre_archivo: Optional[str] = None) -> "ParsedDocument":
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls(data, nombre_archivo or os.path.basename(path))
+
+    @classmethod
+    def from_spilled_file(cls, path: str, nombre_archivo: str, sha256: str, size: int) -> "ParsedDocument":
+        """Documento respaldado por un archivo temporal del que pasa a ser dueño (se borra en `close`)."""
+        document = cls(b"", nombre_archivo, sha256=sha256)
+        document._data = None
+        document.path = path
+        document.size = size
+        return document
+
+    def open_stream(self) -> BinaryIO:
+        """Abre un stream binario independiente sobre el contenido. El llamador debe cerrarlo."""
+        if self.path is not None:
+            return open(self.path, "rb")
+        return io.BytesIO(self._data)
+
+    @property
+    def reader(self) -> "PdfReader":
+        with self._lock:
+            if self._reader is None:
+                from PyPDF2 import PdfReader  # import perezoso
+                self._reader_stream = self.open_stream()
+                self._reader = PdfReader(self._reader_stream)
+            return self._reader
+
+    @property
+    def page_count(self) -> int:
+        return self.text_engine.page_count(self)
+
+    def page_text(self, page_num: int) -> str:
+        """Texto de una página (0-indexada), extraído una sola vez."""
+        with self._lock:
+            if page_num not in self._page_texts:
+                self._page_texts[page_num] = self.text_engine.extract_page(self, page_num)
+            return self._page_texts[page_num]
+
+    def page_texts(self) -> list[str]:
+        """Texto de todas las páginas, en orden (incluye páginas vacías). Se extrae en una sola pasada del motor."""
+        with self._lock:
+            page_count = self.page_count
+            if len(self._page_texts) < page_count:
+                for page_num, text in enumerate(self.text_engine.extract_pages(self)):
+                    self._page_texts.setdefault(page_num, text)
+            return [self._page_texts[i] for i in range(page_count)]
+
+    @contextmanager
+    def fitz(self) -> Iterator["fitz.Document"]:
+        """
+        Documento PyMuPDF abierto desde memoria (o desde su archivo si está en disco), con acceso
+        exclusivo: las tareas de un documento corren en paralelo y PyMuPDF no es thread-safe,
+        así que el lock global se mantiene mientras dure el bloque `with`.
+        """
+        with _FITZ_LOCK:
+            if self._fitz_doc is None:
+                import fitz  # PyMuPDF, import perezoso
+
+                if self.path is not None:
+                    self._fitz_doc = fitz.open(self.path, filetype="pdf")
+                else:
+                    data = self._data if isinstance(self._data, (bytes, bytearray)) else bytes(self._data)
+                    self._fitz_doc = fitz.open(stream=data, filetype="pdf")
+            yield self._fitz_doc
+
+    def materialize_path(self) -> str:
+        """Ruta a un archivo con el contenido; si el documento está en memoria, lo vuelca una vez a un temporal propio."""
+        with self._lock:
+            if self.path is None:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f:
+                    f.write(self._data)
+                self.path = f.name
+            return self.path
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        with _FITZ_LOCK:
+            if self._fitz_doc is not None:
+                self._fitz_doc.close()
+                self._fitz_doc = None
+        if self._reader_stream is not None:
+            self._reader_stream.close()
+            self._reader_stream = None
+        self._reader = None
+        self._page_texts.clear()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"Error eliminando archivo temporal {self.path}: {e}")
+            self.path = None
+
+
+class SpillBuffer:
+    """
+    Buffer de escritura que se mantiene en memoria hasta `threshold` bytes
+    y, a partir de ahí, se vuelca a un archivo temporal con nombre (que PyMuPDF puede abrir).
+    """
+
+    def __init__(self, threshold: int = PDF_IN_MEMORY_MAX_BYTES):
+        self.threshold = threshold
+        self.size = 0
+        self._memory: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+
+    def spills(self, chunk: BytesLike) -> bool:
+        """True si escribir `chunk` toca disco (ya se volcó o este bloque supera el umbral)."""
+        chunk_size = len(chunk) if not isinstance(chunk, memoryview) else chunk.nbytes
+        return self._file is not None or self.size + chunk_size > self.threshold
+
+    def write(self, chunk: BytesLike):
+        chunk_size = len(chunk) if not isinstance(chunk, memoryview) else chunk.nbytes
+        if self._file is None and self.size + chunk_size > self.threshold:
+            self._rollover()
+        (self._file or self._memory).write(chunk)
+        self.size += chunk_size
+
+    def _rollover(self):
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+        self._file.write(self._memory.getbuffer())
+        self._memory = None
+
+    def to_document(self, nombre_archivo: str, sha256: str) -> ParsedDocument:
+        """Entrega el contenido a un ParsedDocument (en memoria o respaldado por el archivo temporal)."""
+        if self._file is not None:
+            self._file.close()
+            return ParsedDocument.from_spilled_file(self._file.name, nombre_archivo, sha256, self.size)
+        return ParsedDocument(self._memory.getvalue(), nombre_archivo, sha256=sha256)
+
+    def discard(self):
+        """Descarta el contenido (p. ej. si la subida se rechaza a mitad)."""
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self._file.name)
+            except OSError:
+                pass
+            self._file = None
+        self._memory = None
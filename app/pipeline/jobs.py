@@ -0,0 +1,132 @@
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config.settings import *
+
+
+class Job:
+    """Estado de un job de ingesta: etapas recorridas, resultado o error."""
+
+    def __init__(self, nombre_archivo: str, doc_hash: str):
+        self.id = uuid.uuid4().hex
+        self.nombre_archivo = nombre_archivo
+        self.doc_hash = doc_hash
+        self.estado = "EN_COLA"
+        self.creado = datetime.utcnow()
+        self.inicio: Optional[datetime] = None
+        self.fin: Optional[datetime] = None
+        self.etapas: List[Dict[str, Any]] = []
+        self.resultado: Any = None
+        self.error: Any = None
+        self._lock = threading.Lock()
+
+    def registrar_etapa(self, etapa: str, estado: str):
+        """Callback de progreso que recibe el pipeline en cada etapa."""
+        with self._lock:
+            self.etapas.append({"etapa": etapa, "estado": estado, "timestamp": datetime.utcnow().isoformat()})
+
+    def iniciar(self):
+        with self._lock:
+            self.estado = "EN_PROCESO"
+            self.inicio = datetime.utcnow()
+
+    def terminar(self, resultado: Any = None, error: Any = None):
+        """Marca el job como COMPLETADO o, si hay `error`, como ERROR."""
+        with self._lock:
+            self.resultado = resultado
+            self.error = error
+            self.estado = "ERROR" if error is not None else "COMPLETADO"
+            self.fin = datetime.utcnow()
+
+    @property
+    def terminado(self) -> bool:
+        with self._lock:
+            return self.estado in ("COMPLETADO", "ERROR")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "nombre_archivo": self.nombre_archivo,
+                "hash": self.doc_hash,
+                "estado": self.estado,
+                "creado": self.creado.isoformat(),
+                "inicio": self.inicio.isoformat() if self.inicio else None,
+                "fin": self.fin.isoformat() if self.fin else None,
+                "etapas": list(self.etapas),
+                "resultado": self.resultado,
+                "error": self.error,
+            }
+
+
+class JobQueueFullError(Exception):
+    """Se lanza cuando hay demasiados jobs pendientes en el pool."""
+
+
+class JobManager:
+    """
+    Ejecuta la ingesta de documentos en un pool acotado de hilos, fuera del event loop.
+    Conserva en memoria los últimos `max_retained` jobs para consultar su estado.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, max_pending: int = JOBS_MAX_PENDING, max_retained: int = JOBS_MAX_RETAINED):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingesta")
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], nombre_archivo: str, doc_hash: str, *args, **kwargs) -> Job:
+        """
+        Encola `func(*args, on_stage=job.registrar_etapa, **kwargs)` y devuelve el job inmediatamente.
+        Si la función lanza una excepción con `detail` (p. ej. HTTPException), se guarda como error del job.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError(f"Hay {self._pending} jobs pendientes; inténtelo más tarde.")
+            job = Job(nombre_archivo, doc_hash)
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._evict_finished()
+
+        def _run():
+            # Los cambios de estado pasan por el lock del job: GET /jobs/{id} los lee desde otro hilo
+            job.iniciar()
+            try:
+                job.terminar(resultado=func(*args, on_stage=job.registrar_etapa, **kwargs))
+            except Exception as e:
+                job.terminar(error=getattr(e, "detail", None) or str(e))
+                if not hasattr(e, "detail"):
+                    traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+        self.executor.submit(_run)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_finished(self):
+        """Descarta los jobs terminados más antiguos cuando se supera `max_retained`."""
+        if len(self._jobs) <= self.max_retained:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id].terminado:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+job_manager = JobManager()
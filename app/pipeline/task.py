@@ -1,16 +1,23 @@
-from app.ai.classify import classify_with_ai, DocumentSource
+from app.ai.classify import classify_document, DocumentSource
 from app.ai.extract_data import EXTRACTORS
 from app.ai.extract_graphs import extraer_graficos_mysteel
-from app.services.vector_db import QdrantManager
 from app.services.db_manager import db_manager
+from app.services.hash_index import hash_index
 from app.config.settings import *
 from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Optional
 import traceback
-import os
+import re
 import time
 import uuid
-from PyPDF2 import PdfReader
-from app.pipeline.utils import get_pdf_chunks, _serialize_special_types
+from concurrent.futures import ThreadPoolExecutor
+from app.pipeline.context import build_context
+from app.pipeline.document import ParsedDocument
+from app.pipeline.utils import get_pdf_chunks, page_fingerprints, _serialize_special_types
+
+if TYPE_CHECKING:
+    # Solo para anotaciones: qdrant_client se carga en el warm-up, no al importar el pipeline
+    from app.services.vector_db import QdrantManager
 
 TASK_REGISTRY = {
     "get_mysteel_inventory": {
@@ -20,41 +27,50 @@ TASK_REGISTRY = {
             "Pellet inventory", "Concentrate inventory", "Lump inventory",
             "Fines inventory", "Australian iron ore inventory", "Brazilian iron ore inventory"
         ],
+        "max_context_tokens": 4000,
         "extractor_func": EXTRACTORS["extraer_inventario_mysteel"]
     },
     "get_mysteel_news": {
         "source": "Mysteel",
         "extractor_func": EXTRACTORS["extraer_noticias_mysteel"],
         "search_queries": ["news", "market commentary", "outlook"],
-        "needs_pdf_path": False
+        "max_context_tokens": 8000,
+        "needs_document": False
     },
     "get_mysteel_graphs": {
         "source": "Mysteel",
         "extractor_func": extraer_graficos_mysteel,
         "search_queries": [], # No necesita búsqueda semántica
-        "needs_pdf_path": True # Necesita la ruta del archivo para PyMuPDF
+        "needs_document": True # Necesita el ParsedDocument para PyMuPDF
     },
     
     # Platts
     "get_platts_prices": {
         "source": "Platts",
         "search_queries": ["Tabla o texto con los precios de Iron Ore Platts 62% y 65% CFR China con su fecha", "Tabla o texto con los precios de IOMGD00 con su fecha"],
+        "fast_extractor": EXTRACTORS["Platts_reglas"], # Primero por reglas; el LLM solo para campos no resueltos
         "extractor_func": EXTRACTORS["Platts"]
     },
     "get_fastmarkets_prices": {
         "source": "FastMarkets",
         "search_queries": ["Tabla o texto con los precios de Iron Ore MB-IRO-0009 y MB-IRO-0019 VIU con su fecha de publicación"],
+        "fast_extractor": EXTRACTORS["FastMarkets_reglas"],
         "extractor_func": EXTRACTORS["FastMarkets"]
     },
     "get_baltic_prices": {
         "source": "Baltic",
         "search_queries": ["Tabla o texto con el precio del flete C3 Tubarao to Qingdao con su fecha"],
+        "fast_extractor": EXTRACTORS["Baltic_reglas"],
         "extractor_func": EXTRACTORS["Baltic"]
     },
 }
 
+def registry_search_queries() -> list[str]:
+    """Todas las consultas semánticas estáticas del TASK_REGISTRY (para precalcular sus embeddings)."""
+    return [query for task in TASK_REGISTRY.values() for query in task.get("search_queries", [])]
+
 # 3. La función `run_task` ahora incluye logging
-def run_task(document_id: int, document_info: DocumentSource, task_name: str, qdrant_manager: QdrantManager, pdf_path: str = None):
+def run_task(document_id: int, document_info: DocumentSource, task_name: str, qdrant_manager: "QdrantManager", document: ParsedDocument = None):
     """Ejecuta una tarea individual, mide su tiempo y registra el resultado."""
     print(f"\n--- ▶️ Ejecutando Tarea: '{task_name}' ---")
     task = TASK_REGISTRY[task_name]
@@ -64,31 +80,66 @@ def run_task(document_id: int, document_info: DocumentSource, task_name: str, qd
     resultado_tarea = None
     num_resultados = 0
     estado = "ERROR"
+    detalles = {}
+    parcial = None
+    campos_llm = None
 
     try:
         extractor_function = task["extractor_func"]
+
+        # Fast path determinista: si resuelve todos los campos con confianza, no hay búsqueda ni LLM
+        resultado_reglas = None
+        if task.get("fast_extractor"):
+            try:
+                resultado_reglas = task["fast_extractor"](document)
+            except Exception as e:
+                # Las reglas son solo un atajo: si fallan, el LLM extrae todos los campos
+                print(f"⚠️ Falló el extractor por reglas de '{task_name}', se usa el LLM: {e}")
+                detalles["via"] = "llm"
+                detalles["error_reglas"] = str(e)
+        if resultado_reglas is not None:
+            parcial, confianza = resultado_reglas
+            campos_llm = [campo for campo in type(parcial).model_fields if confianza.get(campo, 0) < FAST_PATH_MIN_CONFIDENCE]
+            detalles["campos_reglas"] = sorted(campo for campo in confianza if campo not in campos_llm)
+            if not campos_llm:
+                detalles["via"] = "reglas"
+                resultado_tarea = parcial
+                estado = "SUCCESS"
+                return resultado_tarea
+            # Solo conservamos del parcial los campos resueltos con confianza
+            parcial = parcial.model_copy(update={campo: None for campo in campos_llm})
         
-        if task.get("needs_pdf_path", False):
-            contexto_para_extraccion = pdf_path
+        if task.get("needs_document", False):
+            contexto_para_extraccion = document
         else:
             if not task["search_queries"]:
                 return None
             
             collection_name = f"source_{document_info.source.lower()}"
-            relevant_chunks = set()
-            for query in task["search_queries"]:
-                results = qdrant_manager.search(collection_name, query)
-                for res in results:
-                    if 'content' in res: relevant_chunks.add(res['content'])
+            # Una sola llamada batch por tarea, limitada a los chunks del documento actual
+            results = qdrant_manager.search_batch(collection_name, task["search_queries"], doc_hash=document.hash)
+            # Ordenado por score, sin casi-duplicados y acotado al presupuesto de tokens de la tarea
+            contexto_para_extraccion, stats_contexto = build_context(results, task.get("max_context_tokens", CONTEXT_MAX_TOKENS))
+            detalles.update(stats_contexto)
             
-            if not relevant_chunks:
+            if not contexto_para_extraccion:
                 print(f"⚠️ No se encontraron chunks relevantes para la tarea '{task_name}'.")
+                if parcial is not None and detalles["campos_reglas"]:
+                    detalles["via"] = "reglas"
+                    resultado_tarea = parcial
+                    estado = "SUCCESS"
+                    return resultado_tarea
                 estado = "SUCCESS_NO_DATA"
                 return None
-
-            contexto_para_extraccion = "\n\n---\n\n".join(list(relevant_chunks))
         
         resultado_tarea = extractor_function(contexto_para_extraccion)
+        if parcial is not None:
+            # El LLM solo aporta los campos que las reglas no resolvieron
+            detalles["via"] = "reglas+llm" if detalles["campos_reglas"] else "llm"
+            detalles["campos_llm"] = campos_llm
+            resultado_tarea = parcial.model_copy(update={campo: getattr(resultado_tarea, campo) for campo in campos_llm})
+        elif "error_reglas" in detalles:
+            detalles["campos_llm"] = list(type(resultado_tarea).model_fields)
         estado = "SUCCESS"
 
     except Exception as e:
@@ -120,43 +171,121 @@ def run_task(document_id: int, document_info: DocumentSource, task_name: str, qd
             inicio=start_time,
             fin=end_time,
             resultados_encontrados=num_resultados,
-            error_mensaje=error_msg
+            error_mensaje=error_msg,
+            detalles=detalles or None
         )
 
     return resultado_tarea
 
 
+def relocate_points(page_text: str, page_num: int, points: list) -> Optional[list]:
+    """
+    Recoloca los puntos de una página base en el texto de la página nueva. La huella de página
+    ignora diferencias de espacios, así que los offsets del documento base pueden no valer:
+    cada chunk se vuelve a buscar (tolerando espacios) en orden y toma el contenido y los offsets
+    del texto nuevo. Devuelve [(chunk, vector)] o None si algún chunk no se encuentra.
+    """
+    chunks, cursor = [], 0
+    for point in sorted(points, key=lambda p: p.payload["char_start"]):
+        content = point.payload["content"]
+        start = page_text.find(content, cursor)
+        if start >= 0:
+            end = start + len(content)
+        else:
+            match = re.compile(r"\s+".join(map(re.escape, content.split()))).search(page_text, cursor)
+            if match is None:
+                return None
+            start, end = match.span()
+        chunks.append(({"content": page_text[start:end], "page": page_num, "char_start": start, "char_end": end}, point.vector))
+        # Los chunks pueden solaparse: el siguiente empieza como pronto donde empezó este
+        cursor = start
+    return chunks
+
+
+def reusable_pages(document: ParsedDocument, fingerprints: list[str], document_id: int, fuente: str,
+                   collection_name: str, index_version: str, qdrant_manager: "QdrantManager"):
+    """
+    Busca las páginas cuya huella coincide con alguna del documento anterior de la misma fuente y
+    recupera sus puntos de Qdrant. Devuelve (documento_base, {pagina_nueva: pagina_base}, [(chunk, vector)]),
+    con los chunks ya recolocados en la página nueva. Las páginas sin puntos recuperables se reprocesan.
+    """
+    if not PAGE_DELTA_ENABLED:
+        return None, {}, []
+    base = db_manager.get_previous_page_hashes(fuente, document_id)
+    if not base:
+        return None, {}, []
+
+    candidatas = {
+        page_num: base["paginas"][fingerprint]
+        for page_num, fingerprint in enumerate(fingerprints, start=1)
+        if fingerprint in base["paginas"]
+    }
+    points = qdrant_manager.get_page_points(collection_name, base["hash_documento"], sorted(set(candidatas.values())), index_version)
+    puntos_por_pagina: dict[int, list] = {}
+    for point in points:
+        puntos_por_pagina.setdefault(point.payload["page"], []).append(point)
+
+    paginas_reutilizadas, reutilizados = {}, []
+    for page_num, pagina_base in candidatas.items():
+        page_text = document.page_text(page_num - 1)
+        # Una página vacía no genera chunks: se omite sin necesitar puntos
+        if pagina_base not in puntos_por_pagina and page_text.strip():
+            continue
+        chunks = relocate_points(page_text, page_num, puntos_por_pagina.get(pagina_base, []))
+        if chunks is None:
+            continue
+        paginas_reutilizadas[page_num] = pagina_base
+        reutilizados.extend(chunks)
+
+    print(f"♻️ {len(paginas_reutilizadas)}/{len(fingerprints)} páginas sin cambios respecto al documento {base['documento_id']}.")
+    return base, paginas_reutilizadas, reutilizados
+
+
 # 4. El orquestador ahora tiene logging extensivo
-def process_pdf_automatically(pdf_path: str, doc_hash: str, qdrant_manager: QdrantManager):
-    """Orquestador que clasifica, indexa en Qdrant, ejecuta tareas y registra todo en la BD."""
-    print(f"--- 🚀 Iniciando Procesamiento Automático para: {os.path.basename(pdf_path)} ---")
+def process_pdf_automatically(document: ParsedDocument, qdrant_manager: "QdrantManager", document_info: Optional[DocumentSource] = None, on_stage: Optional[Callable[[str, str], None]] = None):
+    """
+    Orquestador que clasifica, indexa en Qdrant, ejecuta tareas y registra todo en la BD.
+    Si el llamador ya clasificó el documento, se reutiliza `document_info` en vez de volver a clasificar.
+    `on_stage(etapa, estado)` se invoca al terminar cada etapa para reportar progreso (p. ej. a un job).
+    """
+    doc_hash = document.hash
+    print(f"--- 🚀 Iniciando Procesamiento Automático para: {document.nombre_archivo} ---")
     
     # --- Clasificación y guardado inicial del documento ---
     start_time = time.time()
     try:
-        reader = PdfReader(pdf_path)
-        first_page_text = reader.pages[0].extract_text().strip()
-        document_info = classify_with_ai(first_page_text)
+        if document_info is None:
+            document_info = classify_document(document.page_text(0))
         print(f"\n✅ Documento clasificado como: '{document_info.source}' '{document_info.date}'")
     except Exception as e:
         print(f"Error Crítico en Clasificación: {e}")
+        if on_stage:
+            on_stage("Clasificación", "ERROR")
         # No podemos continuar si no podemos clasificar
         return {"status": "error_classification", "error": str(e)}
 
     # --- Guardar en Base de Datos PostgreSQL y obtener ID ---
     document_id = db_manager.save_document(
-        nombre_archivo=os.path.basename(pdf_path),
+        nombre_archivo=document.nombre_archivo,
         fecha_documento=document_info.date,
         fuente=document_info.source,
         hash_documento=doc_hash
     )
+    # Una vez registrado en PostgreSQL, el hash pasa al índice de duplicados en memoria
+    if document_id:
+        hash_index.add(doc_hash)
 
     if not document_id:
         print(f"🛑 El documento con hash {doc_hash[:10]}... ya existe en la base de datos. Se detiene el procesamiento.")
         return {"status": "skipped_duplicate_in_db", "hash": doc_hash}
 
+    def registrar_etapa(etapa: str, estado: str, duracion_ms: int, **kwargs):
+        db_manager.log_procesamiento_evento(document_id, etapa, estado, duracion_ms, **kwargs)
+        if on_stage:
+            on_stage(etapa, estado)
+
     dur_ms = int((time.time() - start_time) * 1000)
-    db_manager.log_procesamiento_evento(document_id, "Clasificación", "SUCCESS", dur_ms)
+    registrar_etapa("Clasificación", "SUCCESS", dur_ms)
 
     # --- Indexación en Qdrant ---
     start_time = time.time()
@@ -164,16 +293,38 @@ def process_pdf_automatically(pdf_path: str, doc_hash: str, qdrant_manager: Qdra
         collection_name = f"source_{document_info.source.lower()}"
         qdrant_manager.get_or_create_collection(collection_name)
         
-        all_chunks = get_pdf_chunks(pdf_path)
+        # Huellas por página: las páginas idénticas al reporte anterior de la fuente reutilizan sus puntos
+        fingerprints = page_fingerprints(document)
+        index_version = f"{qdrant_manager.model_name}|{CHUNK_STRATEGY}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+        base, paginas_reutilizadas, puntos_reutilizados = reusable_pages(
+            document, fingerprints, document_id, document_info.source, collection_name, index_version, qdrant_manager
+        )
+
+        nuevos = get_pdf_chunks(document, skip_pages=set(paginas_reutilizadas))
+        # Se combinan chunks nuevos y reutilizados en orden de página/offset para numerarlos de forma estable
+        all_chunks = sorted(
+            [(chunk, None) for chunk in nuevos] + puntos_reutilizados,
+            key=lambda item: (item[0]["page"], item[0]["char_start"]),
+        )
         ids = [str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{doc_hash}-{i}")) for i in range(len(all_chunks))]
-        metadata = [{"document_hash": doc_hash, "document_id": os.path.basename(pdf_path), "chunk_index": i, "content": chunk, "source": document_info.source, "document_date": document_info.date.isoformat()} for i, chunk in enumerate(all_chunks)]
-        qdrant_manager.upsert_chunks(collection_name, all_chunks, metadata, ids)
+        metadata = [{"document_hash": doc_hash, "document_id": document.nombre_archivo, "chunk_index": i, "content": chunk["content"], "page": chunk["page"], "char_start": chunk["char_start"], "char_end": chunk["char_end"], "page_hash": fingerprints[chunk["page"] - 1], "index_version": index_version, "source": document_info.source, "document_date": document_info.date.isoformat()} for i, (chunk, _) in enumerate(all_chunks)]
+        reused_vectors = {i: vector for i, (_, vector) in enumerate(all_chunks) if vector is not None}
+        embeddings_cacheados = qdrant_manager.upsert_chunks(collection_name, [chunk["content"] for chunk, _ in all_chunks], metadata, ids, reused_vectors=reused_vectors)
+        # Solo tras indexar: los siguientes reportes pueden confiar en que estos puntos existen
+        db_manager.save_page_hashes(document_id, fingerprints)
         
         dur_ms = int((time.time() - start_time) * 1000)
-        db_manager.log_procesamiento_evento(document_id, "Indexación Qdrant", "SUCCESS", dur_ms, detalles={"chunks": len(all_chunks)})
+        registrar_etapa("Indexación Qdrant", "SUCCESS", dur_ms, detalles={
+            "chunks": len(all_chunks),
+            "embeddings_cacheados": embeddings_cacheados,
+            "paginas": len(fingerprints),
+            "paginas_omitidas": len(paginas_reutilizadas),
+            "chunks_reutilizados": len(reused_vectors),
+            "documento_base": base["documento_id"] if base else None,
+        })
     except Exception as e:
         dur_ms = int((time.time() - start_time) * 1000)
-        db_manager.log_procesamiento_evento(document_id, "Indexación Qdrant", "ERROR", dur_ms, error_mensaje=str(e))
+        registrar_etapa("Indexación Qdrant", "ERROR", dur_ms, error_mensaje=str(e))
         print(f"Error en Indexación: {e}")
         return {"status": "error_indexing", "error": str(e)}
 
@@ -191,26 +342,41 @@ def process_pdf_automatically(pdf_path: str, doc_hash: str, qdrant_manager: Qdra
     resultados_finales = {}
     if tasks_to_run:
         print(f"\n▶️ Tareas a ejecutar para '{document_info.source}': {', '.join(tasks_to_run)}")
+        # Las tareas son independientes (llamadas LLM distintas): se ejecutan en paralelo con un tope
+        # de concurrencia. Cada run_task registra su propio tiempo en logs_tareas.
+        def _ejecutar(task_name: str):
+            resultado = run_task(document_id, document_info, task_name, qdrant_manager, document=document)
+            if on_stage:
+                on_stage(f"Tarea {task_name}", "COMPLETADA")
+            return resultado
+
+        max_workers = max(1, min(TASK_CONCURRENCY, len(tasks_to_run)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarea") as executor:
+            futures = {task_name: executor.submit(_ejecutar, task_name) for task_name in tasks_to_run}
+
+        # Recorremos en el orden del registro para que resultados_finales sea determinista
         for task_name in tasks_to_run:
-            # Pasamos el document_id a run_task para el logging
-            resultado_tarea = run_task(document_id, document_info, task_name, qdrant_manager, pdf_path=pdf_path)
+            resultado_tarea = futures[task_name].result()
             if resultado_tarea:
                 # Convertir Pydantic a dict y asegurar que los tipos especiales sean serializables
                 dumped_result = resultado_tarea.model_dump() if hasattr(resultado_tarea, 'model_dump') else resultado_tarea
                 resultados_finales[task_name] = _serialize_special_types(dumped_result)
 
     dur_ms = int((time.time() - start_time) * 1000)
-    db_manager.log_procesamiento_evento(document_id, "Ejecución de Tareas", "SUCCESS", dur_ms, detalles={"tareas_ejecutadas": len(tasks_to_run)})
+    registrar_etapa("Ejecución de Tareas", "SUCCESS", dur_ms, detalles={"tareas_ejecutadas": len(tasks_to_run)})
 
     # --- Guardar resultados en PostgreSQL ---
     start_time = time.time()
     print("\n--- 💾 Guardando resultados en la Base de Datos... ---")
     
     # Pasamos la fecha del documento como fallback
-    db_manager.save_results_to_db(document_id, document_info.source, document_info.date, resultados_finales)
+    filas_guardadas = db_manager.save_results_to_db(document_id, document_info.source, document_info.date, resultados_finales)
     
     dur_ms = int((time.time() - start_time) * 1000)
-    db_manager.log_procesamiento_evento(document_id, "Guardado en DB", "SUCCESS", dur_ms)
+    if filas_guardadas is None:
+        registrar_etapa("Guardado en DB", "ERROR", dur_ms, error_mensaje="La transacción de guardado de resultados falló y se revirtió.")
+    else:
+        registrar_etapa("Guardado en DB", "SUCCESS", dur_ms, detalles={"filas_insertadas": filas_guardadas})
     print("--- ✅ Proceso Finalizado ---")
 
     return _serialize_special_types(resultados_finales)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import multiprocessing
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.config.settings import *
+
+
+def _split_ranges(total: int, parts: int) -> list[tuple[int, int]]:
+    size = -(-total // parts)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+class TextEngine(ABC):
+    """
+    Motor de extracción de texto por página. `extract_pages` devuelve una lista con el
+    texto (strip) de cada página, en orden e incluyendo las vacías, igual que
+    `ParsedDocument.page_texts`.
+    """
+    name = "base"
+
+    @abstractmethod
+    def page_count(self, document) -> int:
+        ...
+
+    @abstractmethod
+    def extract_page(self, document, page_num: int) -> str:
+        ...
+
+    def extract_pages(self, document) -> list[str]:
+        return [self.extract_page(document, i) for i in range(self.page_count(document))]
+
+    def shutdown(self):
+        """Libera recursos del motor (p. ej. pools de procesos)."""
+
+
+class PyPDF2Engine(TextEngine):
+    """Motor original, en Python puro."""
+    name = "pypdf2"
+
+    def page_count(self, document) -> int:
+        return len(document.reader.pages)
+
+    def extract_page(self, document, page_num: int) -> str:
+        return (document.reader.pages[page_num].extract_text() or "").strip()
+
+
+def _pymupdf_extract_range(path: str, start: int, end: int) -> list[str]:
+    """Worker de proceso: abre el PDF por su ruta (no se serializan los bytes) y extrae el rango de páginas [start, end)."""
+    import fitz  # PyMuPDF, import perezoso (también en los procesos worker)
+
+    doc = fitz.open(path, filetype="pdf")
+    try:
+        return [doc[i].get_text("text").strip() for i in range(start, end)]
+    finally:
+        doc.close()
+
+
+class PyMuPDFEngine(TextEngine):
+    """
+    Motor basado en PyMuPDF (C, mucho más rápido en páginas densas). Para documentos
+    grandes puede repartir rangos de páginas en un pool de procesos. En el proceso actual
+    todo acceso a PyMuPDF pasa por `ParsedDocument.fitz()`, que lo serializa.
+    """
+    name = "pymupdf"
+
+    def __init__(self, parallel_workers: int = TEXT_PARALLEL_WORKERS, parallel_min_pages: int = TEXT_PARALLEL_MIN_PAGES,
+                 start_method: str = TEXT_PARALLEL_START_METHOD):
+        self.parallel_workers = parallel_workers
+        self.parallel_min_pages = parallel_min_pages
+        self.start_method = start_method
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # fork copiaría en el hijo locks tomados por otros hilos (p. ej. _FITZ_LOCK) y podría bloquearlo
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.parallel_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                )
+            return self._pool
+
+    def page_count(self, document) -> int:
+        with document.fitz() as doc:
+            return len(doc)
+
+    def extract_page(self, document, page_num: int) -> str:
+        with document.fitz() as doc:
+            return doc[page_num].get_text("text").strip()
+
+    def extract_pages(self, document) -> list[str]:
+        page_count = self.page_count(document)
+        if self.parallel_workers <= 1 or page_count < self.parallel_min_pages:
+            with document.fitz() as doc:
+                return [doc[i].get_text("text").strip() for i in range(page_count)]
+
+        # Los workers reciben la ruta del PDF: si está en memoria se vuelca una vez a un archivo temporal
+        path = document.materialize_path()
+        ranges = _split_ranges(page_count, self.parallel_workers)
+        pool = self._get_pool()
+        futures = [pool.submit(_pymupdf_extract_range, path, start, end) for start, end in ranges]
+        return [text for future in futures for text in future.result()]
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+TEXT_ENGINES: dict[str, TextEngine] = {
+    "pypdf2": PyPDF2Engine(),
+    "pymupdf": PyMuPDFEngine(),
+}
+
+
+def get_text_engine(name: Optional[str] = None) -> TextEngine:
+    """Devuelve el motor registrado con ese nombre (por defecto, TEXT_ENGINE)."""
+    engine_name = (name or TEXT_ENGINE).lower()
+    if engine_name not in TEXT_ENGINES:
+        raise ValueError(f"Motor de texto desconocido: '{engine_name}'. Disponibles: {', '.join(TEXT_ENGINES)}")
+    return TEXT_ENGINES[engine_name]
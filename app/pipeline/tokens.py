@@ -0,0 +1,58 @@
+import threading
+
+from app.config.settings import *
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_embedding_tokenizer = None
+_embedding_tokenizer_lock = threading.Lock()
+
+
+def get_encoding() -> "tiktoken.Encoding":
+    """Tokenizador de los modelos OpenAI usados por el pipeline (cargado una sola vez)."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken  # import perezoso: se carga en el warm-up o en el primer uso
+
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Recorta el texto a como máximo `max_tokens` tokens."""
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def get_embedding_tokenizer():
+    """
+    Tokenizador (WordPiece) del modelo de embeddings, sin truncado ni padding. Es el que decide qué
+    cabe en EMBEDDING_MAX_SEQ_LENGTH, así que los chunks a indexar se miden con él y no con tiktoken.
+    """
+    global _embedding_tokenizer
+    if _embedding_tokenizer is None:
+        with _embedding_tokenizer_lock:
+            if _embedding_tokenizer is None:
+                from huggingface_hub import hf_hub_download
+                from tokenizers import Tokenizer
+
+                repo_id = EMBEDDING_MODEL_NAME if "/" in EMBEDDING_MODEL_NAME else f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+                tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+                tokenizer.no_truncation()
+                tokenizer.no_padding()
+                _embedding_tokenizer = tokenizer
+    return _embedding_tokenizer
+
+
+def embedding_token_offsets(text: str) -> list[tuple[int, int]]:
+    """Offsets de caracteres (inicio, fin) de cada token del modelo de embeddings, sin tokens especiales."""
+    return get_embedding_tokenizer().encode(text, add_special_tokens=False).offsets
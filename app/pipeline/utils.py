@@ -1,20 +1,36 @@
-from PyPDF2 import PdfReader
 from datetime import date, datetime
 import base64
-import os
-from typing import Any
+import hashlib
+import re
+from typing import Any, Optional
 
-def get_pdf_chunks(path: str) -> list[str]:
-    """Divide el PDF en una lista de textos, uno por página. (Sin cambios)"""
-    print(f"📄 Dividiendo el PDF: {os.path.basename(path)}...")
-    reader = PdfReader(path)
-    if not reader.pages:
+from app.config.settings import *
+from app.pipeline.chunking import chunk_pages
+from app.pipeline.document import ParsedDocument
+
+def get_pdf_chunks(document: ParsedDocument, skip_pages: Optional[set[int]] = None) -> list[dict]:
+    """
+    Divide el PDF en chunks para indexar (por página, ventanas de tokens o bloques, según CHUNK_STRATEGY),
+    reutilizando el texto ya extraído. Cada chunk incluye su página y offsets dentro de ella.
+    Las páginas de `skip_pages` (1-indexadas, p. ej. sin cambios respecto al reporte anterior) se omiten.
+    """
+    print(f"📄 Dividiendo el PDF: {document.nombre_archivo}...")
+    if not document.page_count:
         raise ValueError("El PDF está vacío o no se puede leer.")
     
-    chunks = [page.extract_text().strip() for page in reader.pages if page.extract_text() and page.extract_text().strip()]
-    print(f"   PDF dividido en {len(chunks)} páginas (chunks).")
+    skip_pages = skip_pages or set()
+    page_texts = ["" if page_num in skip_pages else text for page_num, text in enumerate(document.page_texts(), start=1)]
+    chunks = chunk_pages(page_texts)
+    print(f"   PDF dividido en {len(chunks)} chunks ({CHUNK_STRATEGY}).")
     return chunks
 
+def page_fingerprints(document: ParsedDocument) -> list[str]:
+    """SHA-256 del texto normalizado (espacios colapsados) de cada página, en orden."""
+    return [
+        hashlib.sha256(re.sub(r"\s+", " ", text).strip().encode("utf-8")).hexdigest()
+        for text in document.page_texts()
+    ]
+
 def _serialize_special_types(obj):
     """Función recursiva para convertir fechas a ISO y bytes a Base64."""
     if isinstance(obj, (datetime, date)):
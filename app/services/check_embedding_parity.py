@@ -0,0 +1,76 @@
+"""
+Verifica que un backend de embeddings produce los mismos vectores que el backend de referencia (torch).
+
+Uso:
+    python -m app.services.check_embedding_parity [--backend onnx-int8] [--reference torch] [--min-cosine 0.98] [reporte.pdf ...]
+
+Codifica las consultas del TASK_REGISTRY y, si se indican PDFs, sus chunks; reporta la similitud coseno
+mínima y media entre ambos backends, el tiempo de cada uno y termina con código 1 si la mínima queda
+por debajo del umbral.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.services.embeddings import get_embedding_engine
+
+
+def _sample_texts(pdfs: list[str]) -> list[str]:
+    from app.pipeline.document import ParsedDocument
+    from app.pipeline.task import registry_search_queries
+    from app.pipeline.utils import get_pdf_chunks
+
+    texts = list(registry_search_queries())
+    for path in pdfs:
+        document = ParsedDocument.from_path(path)
+        try:
+            texts.extend(chunk["content"] for chunk in get_pdf_chunks(document))
+        finally:
+            document.close()
+    return texts
+
+
+def _encode(engine, texts: list[str], batch_size: int) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    vectors = np.concatenate([engine.encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+    return vectors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad de similitud coseno entre backends de embeddings")
+    parser.add_argument("pdfs", nargs="*", help="PDFs cuyos chunks se añaden a la muestra")
+    parser.add_argument("--backend", default="onnx-int8", help="Backend a validar (onnx, onnx-int8)")
+    parser.add_argument("--reference", default="torch", help="Backend de referencia")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Similitud coseno mínima aceptada por texto")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = _sample_texts(args.pdfs)
+    reference = get_embedding_engine(args.reference)
+    candidate = get_embedding_engine(args.backend)
+    if reference.dimension != candidate.dimension:
+        print(f"❌ Dimensiones distintas: {reference.dimension} vs {candidate.dimension}")
+        sys.exit(1)
+
+    ref_vectors, ref_time = _encode(reference, texts, args.batch_size)
+    cand_vectors, cand_time = _encode(candidate, texts, args.batch_size)
+    cosines = np.sum(ref_vectors * cand_vectors, axis=1) / (
+        np.linalg.norm(ref_vectors, axis=1) * np.linalg.norm(cand_vectors, axis=1)
+    )
+
+    print(f"Textos comparados: {len(texts)}")
+    print(f"{args.reference}: {ref_time:.2f}s ({len(texts) / max(ref_time, 1e-9):.1f} textos/s)")
+    print(f"{args.backend}: {cand_time:.2f}s ({len(texts) / max(cand_time, 1e-9):.1f} textos/s)")
+    print(f"Similitud coseno: mínima {cosines.min():.4f}, media {cosines.mean():.4f}")
+
+    if cosines.min() < args.min_cosine:
+        peor = int(cosines.argmin())
+        print(f"❌ Paridad por debajo de {args.min_cosine}: '{texts[peor][:80]}...'")
+        sys.exit(1)
+    print("✅ Paridad OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,131 @@
 import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import threading
+import time
 from datetime import date, datetime
 from typing import Dict, Any, Optional
 import json
 import base64
 
 from app.config.settings import *
+from app.services.log_sink import LogSink
 
 class DBManager:
+    """
+    Acceso a PostgreSQL a través de un pool de conexiones compartido entre hilos.
+    Las conexiones se piden con `get_db_connection` y se devuelven con `release_connection`.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool falla en vez de esperar cuando se agota: el semáforo acota la espera
+        self._slots = threading.BoundedSemaphore(POSTGRES_POOL_MAX)
+        self._last_used: Dict[int, float] = {}
+        self.log_sink = LogSink(self.write_log_batch)
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    POSTGRES_POOL_MIN,
+                    POSTGRES_POOL_MAX,
+                    dbname=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT
+                )
+            return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        """Descarta conexiones cerradas y hace ping a las que llevan tiempo ociosas."""
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < POSTGRES_POOL_PING_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
     def get_db_connection(self):
-        """Establece una conexión con la base de datos PostgreSQL."""
+        """Obtiene una conexión sana del pool (o None si PostgreSQL no está disponible)."""
+        if not self._slots.acquire(timeout=POSTGRES_POOL_TIMEOUT):
+            print(f"Error: no hay conexiones libres en el pool tras {POSTGRES_POOL_TIMEOUT}s.")
+            return None
         try:
-            conn = psycopg2.connect(
-                dbname=POSTGRES_DB,
-                user=POSTGRES_USER,
-                password=POSTGRES_PASSWORD,
-                host="postgres",
-                port="5432"
-            )
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
             return conn
-        except psycopg2.OperationalError as e:
+        except psycopg2.Error as e:
+            self._slots.release()
             print(f"FATAL: Error al conectar con PostgreSQL: {e}")
             return None
 
+    def release_connection(self, conn):
+        """Devuelve la conexión al pool (el pool hace rollback si quedó una transacción abierta)."""
+        self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._get_pool().putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def warm_pool(self) -> bool:
+        """Abre las conexiones mínimas del pool por adelantado."""
+        try:
+            self._get_pool()
+            return True
+        except psycopg2.Error as e:
+            print(f"FATAL: Error al conectar con PostgreSQL: {e}")
+            return False
+
+    # Migraciones idempotentes para bases creadas con una versión anterior de schema_postgres.sql
+    # (el script de init de Postgres solo se ejecuta al crear el volumen por primera vez)
+    MIGRATIONS = [
+        """
+        CREATE TABLE IF NOT EXISTS paginas_documento (
+            documento_id INTEGER REFERENCES documentos(id),
+            pagina INTEGER NOT NULL,
+            hash_pagina VARCHAR(64) NOT NULL,
+            PRIMARY KEY (documento_id, pagina)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_paginas_documento_hash ON paginas_documento(hash_pagina);",
+    ]
+
+    def ensure_schema(self) -> bool:
+        """Aplica las migraciones pendientes del esquema. Se ejecuta en el warm-up."""
+        conn = self.get_db_connection()
+        if not conn: return False
+
+        try:
+            with conn.cursor() as cur:
+                for sql in self.MIGRATIONS:
+                    cur.execute(sql)
+            conn.commit()
+            return True
+        except psycopg2.Error as e:
+            print(f"FATAL: Error al migrar el esquema de PostgreSQL: {e}")
+            conn.rollback()
+            return False
+        finally:
+            self.release_connection(conn)
+
+    def close_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+
     def save_document(self, nombre_archivo: str, fecha_documento: date, fuente: str, hash_documento: str) -> Optional[int]:
         """Guarda un nuevo documento y devuelve su ID. Si ya existe por hash, devuelve None."""
         sql = """
@@ -45,192 +149,237 @@ class DBManager:
             print(f"Error al guardar el documento: {e}")
             conn.rollback()
         finally:
-            conn.close()
+            self.release_connection(conn)
         
         return document_id
 
-    def save_results_to_db(self, document_id: int, source: str, document_date: date, results: Dict[str, Any]):
-        """Orquesta el guardado de todos los resultados extraídos en las tablas correspondientes."""
-        if not document_id:
-            print("No se proporcionó un ID de documento válido para guardar resultados.")
-            return
-
-        task_savers = {
-            "get_mysteel_inventory": self.save_inventories,
-            "get_mysteel_news": self.save_news,
-            "get_platts_prices": self.save_prices,
-            "get_fastmarkets_prices": self.save_prices,
-            "get_baltic_prices": self.save_prices,
-            "get_mysteel_graphs": self.save_graphs,
-        }
-
-        for task_name, data in results.items():
-            if task_name in task_savers and data and not data.get("error"):
-                task_savers[task_name](document_id, source, document_date, data)
-
-    def save_inventories(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]):
-        sql = """
-            INSERT INTO inventarios (documento_id, fuente, tipo_inventario, valor, fecha_dato)
-            VALUES (%s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
-        """
-        
+    def get_document_hashes(self) -> list[str]:
+        """Devuelve todos los hashes de documentos registrados (para precargar el índice de duplicados)."""
         conn = self.get_db_connection()
-        if not conn: return
-        
-        items_guardados = 0
+        if not conn: return []
+
         try:
             with conn.cursor() as cur:
-                for tipo_inventario, values in data.items():
-                    if values and isinstance(values, dict) and 'valor' in values:
-                        cur.execute(sql, (
-                            document_id,
-                            source,
-                            tipo_inventario,
-                            values.get('valor'),
-                            values.get('fecha') or document_date
-                        ))
-                        items_guardados += 1
-                conn.commit()
-                if items_guardados > 0:
-                    print(f"  -> Guardados {items_guardados} registros de inventario.")
+                cur.execute("SELECT hash_documento FROM documentos WHERE hash_documento IS NOT NULL;")
+                return [row[0] for row in cur.fetchall()]
         except psycopg2.Error as e:
-            print(f"Error al guardar inventarios: {e}")
-            conn.rollback()
+            print(f"Error al leer hashes de documentos: {e}")
+            return []
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def save_news(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]):
-        sql = """
-            INSERT INTO noticias (documento_id, fuente, titulo, resumen, sentimiento, fecha_noticia, categoria, tags)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
+    def get_previous_page_hashes(self, fuente: str, document_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Huellas de página del documento más reciente de la misma fuente (distinto de `document_id`)
+        que tenga páginas registradas. Devuelve {"documento_id", "hash_documento", "paginas": {hash_pagina: pagina}}
+        o None si no hay documento base.
         """
-        items = data.get("noticias", [])
-        if not items: return
-
         conn = self.get_db_connection()
-        if not conn: return
-            
+        if not conn: return None
+
         try:
             with conn.cursor() as cur:
-                for noticia in items:
-                    cur.execute(sql, (
-                        document_id, source, noticia.get("titulo"), noticia.get("resumen"),
-                        noticia.get("sentimiento"), noticia.get("fecha_noticia") or document_date,
-                        noticia.get("categoria"), noticia.get("tags")
-                    ))
-                conn.commit()
-                print(f"  -> Guardadas {len(items)} noticias.")
+                cur.execute("""
+                    SELECT d.id, d.hash_documento FROM documentos d
+                    WHERE d.fuente = %s AND d.id <> %s
+                      AND EXISTS (SELECT 1 FROM paginas_documento p WHERE p.documento_id = d.id)
+                    ORDER BY d.fecha_documento DESC, d.id DESC
+                    LIMIT 1;
+                """, (fuente, document_id))
+                base = cur.fetchone()
+                if not base:
+                    return None
+                cur.execute("SELECT pagina, hash_pagina FROM paginas_documento WHERE documento_id = %s;", (base[0],))
+                paginas = {}
+                for pagina, hash_pagina in cur.fetchall():
+                    paginas.setdefault(hash_pagina, pagina)
+                return {"documento_id": base[0], "hash_documento": base[1], "paginas": paginas}
         except psycopg2.Error as e:
-            print(f"Error al guardar noticias: {e}")
-            conn.rollback()
+            print(f"Error al leer huellas de página: {e}")
+            return None
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def save_prices(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]):
-        sql = """
-            INSERT INTO precios (documento_id, fuente, tipo_precio, valor, fecha_precio, moneda, unidad)
-            VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
-        """
-        
+    def save_page_hashes(self, document_id: int, page_hashes: list[str]) -> bool:
+        """Registra la huella de cada página (1-indexada) del documento."""
+        if not page_hashes:
+            return True
         conn = self.get_db_connection()
-        if not conn: return
-            
-        items_guardados = 0
+        if not conn: return False
+
         try:
             with conn.cursor() as cur:
-                for tipo_precio, values in data.items():
-                    if values and isinstance(values, dict) and 'valor' in values:
-                        cur.execute(sql, (
-                            document_id,
-                            source,
-                            tipo_precio,
-                            values.get('valor'),
-                            values.get('fecha') or document_date,
-                            values.get('moneda', 'USD'),
-                            values.get('unidad', 'ton')
-                        ))
-                        items_guardados += 1
-                conn.commit()
-                if items_guardados > 0:
-                    print(f"  -> Guardados {items_guardados} registros de precios.")
+                execute_values(
+                    cur,
+                    "INSERT INTO paginas_documento (documento_id, pagina, hash_pagina) VALUES %s ON CONFLICT DO NOTHING;",
+                    [(document_id, pagina, hash_pagina) for pagina, hash_pagina in enumerate(page_hashes, start=1)],
+                    page_size=500,
+                )
+            conn.commit()
+            return True
         except psycopg2.Error as e:
-            print(f"Error al guardar precios: {e}")
+            print(f"Error al guardar huellas de página: {e}")
             conn.rollback()
+            return False
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def save_graphs(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]):
-        sql = """
+    # Sentencias multi-fila para execute_values: cada tabla se escribe con un único INSERT por lote
+    BULK_INSERTS = {
+        "inventarios": """
+            INSERT INTO inventarios (documento_id, fuente, tipo_inventario, valor, fecha_dato)
+            VALUES %s ON CONFLICT DO NOTHING RETURNING id;
+        """,
+        "noticias": """
+            INSERT INTO noticias (documento_id, fuente, titulo, resumen, sentimiento, fecha_noticia, categoria, tags)
+            VALUES %s ON CONFLICT DO NOTHING RETURNING id;
+        """,
+        "precios": """
+            INSERT INTO precios (documento_id, fuente, tipo_precio, valor, fecha_precio, moneda, unidad)
+            VALUES %s ON CONFLICT DO NOTHING RETURNING id;
+        """,
+        "graficos": """
             INSERT INTO graficos (documento_id, fuente, titulo, pagina, contenido, descripcion_ia, fecha_grafico)
-            VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING;
+            VALUES %s ON CONFLICT DO NOTHING RETURNING id;
+        """,
+    }
+
+    def save_results_to_db(self, document_id: int, source: str, document_date: date, results: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """
+        Guarda todos los resultados extraídos de un documento en una única transacción,
+        con un INSERT multi-fila por tabla. Es atómico: o se guarda todo o nada.
+        Devuelve el número de filas insertadas por tabla, o None si falló.
         """
-        items = data.get("graficos", [])
-        if not items: return
+        if not document_id:
+            print("No se proporcionó un ID de documento válido para guardar resultados.")
+            return None
 
-        conn = self.get_db_connection()
-        if not conn: return
-            
-        try:
-            with conn.cursor() as cur:
-                for grafico in items:
-                    contenido_bytes = grafico.get("contenido")
-                    if isinstance(contenido_bytes, str):
-                        contenido_bytes = base64.b64decode(contenido_bytes)
-
-                    cur.execute(sql, (
-                        document_id,
-                        source,
-                        grafico.get("titulo"),
-                        grafico.get("pagina"),
-                        contenido_bytes,
-                        grafico.get("descripcion_ia"),
-                        grafico.get("fecha_grafico") or document_date
-                    ))
-                conn.commit()
-                print(f"  -> Guardados {len(items)} gráficos.")
-        except psycopg2.Error as e:
-            print(f"Error al guardar gráficos: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+        task_rows = {
+            "get_mysteel_inventory": ("inventarios", self.inventory_rows),
+            "get_mysteel_news": ("noticias", self.news_rows),
+            "get_platts_prices": ("precios", self.price_rows),
+            "get_fastmarkets_prices": ("precios", self.price_rows),
+            "get_baltic_prices": ("precios", self.price_rows),
+            "get_mysteel_graphs": ("graficos", self.graph_rows),
+        }
+
+        rows_por_tabla: Dict[str, list] = {tabla: [] for tabla in self.BULK_INSERTS}
+        for task_name, data in results.items():
+            if task_name in task_rows and data and not data.get("error"):
+                tabla, build_rows = task_rows[task_name]
+                rows_por_tabla[tabla].extend(build_rows(document_id, source, document_date, data))
+
+        conteos = {tabla: 0 for tabla in self.BULK_INSERTS}
+        if not any(rows_por_tabla.values()):
+            return conteos
 
-    def log_procesamiento_evento(self, documento_id: int, etapa: str, estado: str, duracion_ms: Optional[int] = None, detalles: Optional[Dict] = None, error_mensaje: Optional[str] = None):
-        """Registra un evento en la tabla 'logs_procesamiento'."""
-        sql = """
-            INSERT INTO logs_procesamiento (documento_id, etapa, estado, duracion_ms, detalles, error_mensaje)
-            VALUES (%s, %s, %s, %s, %s, %s);
-        """
         conn = self.get_db_connection()
-        if not conn: return
+        if not conn: return None
 
         try:
             with conn.cursor() as cur:
-                detalles_json = json.dumps(detalles) if detalles else None
-                cur.execute(sql, (documento_id, etapa, estado, duracion_ms, detalles_json, error_mensaje))
-                conn.commit()
+                for tabla, rows in rows_por_tabla.items():
+                    if rows:
+                        insertados = execute_values(cur, self.BULK_INSERTS[tabla], rows, page_size=500, fetch=True)
+                        conteos[tabla] = len(insertados)
+            conn.commit()
+            for tabla, total in conteos.items():
+                if total > 0:
+                    print(f"  -> Guardados {total} registros en '{tabla}'.")
+            return conteos
         except psycopg2.Error as e:
-            print(f"Error al registrar log de procesamiento: {e}")
+            print(f"Error al guardar resultados (se revierte la transacción completa): {e}")
             conn.rollback()
+            return None
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def log_tarea(self, documento_id: int, nombre_tarea: str, estado: str, inicio: datetime, fin: datetime, resultados_encontrados: Optional[int] = None, error_mensaje: Optional[str] = None):
-        """Registra el resultado de una tarea específica en 'logs_tareas'."""
-        sql = """
-            INSERT INTO logs_tareas (documento_id, nombre_tarea, timestamp_inicio, timestamp_fin, estado, resultados_encontrados, error_mensaje)
-            VALUES (%s, %s, %s, %s, %s, %s, %s);
-        """
+    def inventory_rows(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]) -> list[tuple]:
+        return [
+            (document_id, source, tipo_inventario, values.get('valor'), values.get('fecha') or document_date)
+            for tipo_inventario, values in data.items()
+            if values and isinstance(values, dict) and 'valor' in values
+        ]
+
+    def news_rows(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]) -> list[tuple]:
+        return [
+            (
+                document_id, source, noticia.get("titulo"), noticia.get("resumen"),
+                noticia.get("sentimiento"), noticia.get("fecha_noticia") or document_date,
+                noticia.get("categoria"), noticia.get("tags")
+            )
+            for noticia in data.get("noticias", [])
+        ]
+
+    def price_rows(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]) -> list[tuple]:
+        return [
+            (
+                document_id,
+                source,
+                tipo_precio,
+                values.get('valor'),
+                values.get('fecha') or document_date,
+                values.get('moneda', 'USD'),
+                values.get('unidad', 'ton')
+            )
+            for tipo_precio, values in data.items()
+            if values and isinstance(values, dict) and 'valor' in values
+        ]
+
+    def graph_rows(self, document_id: int, source: str, document_date: date, data: Dict[str, Any]) -> list[tuple]:
+        rows = []
+        for grafico in data.get("graficos", []):
+            contenido_bytes = grafico.get("contenido")
+            if isinstance(contenido_bytes, str):
+                contenido_bytes = base64.b64decode(contenido_bytes)
+
+            rows.append((
+                document_id,
+                source,
+                grafico.get("titulo"),
+                grafico.get("pagina"),
+                psycopg2.Binary(contenido_bytes) if contenido_bytes is not None else None,
+                grafico.get("descripcion_ia"),
+                grafico.get("fecha_grafico") or document_date
+            ))
+        return rows
+
+    LOG_INSERTS = {
+        "logs_procesamiento": """
+            INSERT INTO logs_procesamiento (documento_id, timestamp, etapa, estado, duracion_ms, detalles, error_mensaje)
+            VALUES %s;
+        """,
+        "logs_tareas": """
+            INSERT INTO logs_tareas (documento_id, nombre_tarea, timestamp_inicio, timestamp_fin, estado, resultados_encontrados, error_mensaje, detalles)
+            VALUES %s;
+        """,
+    }
+
+    def write_log_batch(self, tabla: str, rows: list[tuple]) -> bool:
+        """Escribe un lote de eventos de log en una sola sentencia. Lo usa el LogSink en segundo plano."""
         conn = self.get_db_connection()
-        if not conn: return
+        if not conn: return False
 
         try:
             with conn.cursor() as cur:
-                cur.execute(sql, (documento_id, nombre_tarea, inicio, fin, estado, resultados_encontrados, error_mensaje))
-                conn.commit()
+                execute_values(cur, self.LOG_INSERTS[tabla], rows, page_size=500)
+            conn.commit()
+            return True
         except psycopg2.Error as e:
-            print(f"Error al registrar log de tarea: {e}")
+            print(f"Error al escribir lote de logs en '{tabla}': {e}")
             conn.rollback()
+            return False
         finally:
-            conn.close()
+            self.release_connection(conn)
+
+    def log_procesamiento_evento(self, documento_id: int, etapa: str, estado: str, duracion_ms: Optional[int] = None, detalles: Optional[Dict] = None, error_mensaje: Optional[str] = None):
+        """Encola un evento para la tabla 'logs_procesamiento' (se escribe por lotes en segundo plano)."""
+        detalles_json = json.dumps(detalles) if detalles else None
+        self.log_sink.enqueue("logs_procesamiento", (documento_id, datetime.now(), etapa, estado, duracion_ms, detalles_json, error_mensaje))
+
+    def log_tarea(self, documento_id: int, nombre_tarea: str, estado: str, inicio: datetime, fin: datetime, resultados_encontrados: Optional[int] = None, error_mensaje: Optional[str] = None, detalles: Optional[Dict] = None):
+        """Encola el resultado de una tarea específica para 'logs_tareas' (se escribe por lotes en segundo plano)."""
+        detalles_json = json.dumps(detalles) if detalles else None
+        self.log_sink.enqueue("logs_tareas", (documento_id, nombre_tarea, inicio, fin, estado, resultados_encontrados, error_mensaje, detalles_json))
 
-db_manager = DBManager() 
\ No newline at end of file
+db_manager = DBManager()
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import *
+
+
+class EmbeddingCache:
+    """
+    Caché persistente (SQLite) de embeddings por (modelo, SHA-256 del texto), guardados como
+    blobs float32. Permite no volver a codificar páginas/chunks repetidos entre reportes.
+    Desaloja por LRU cuando se supera `max_entries` o `max_bytes` (de vectores); ambos totales
+    se calculan una vez al abrir y luego se llevan en memoria.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, enabled: bool = EMBEDDING_CACHE_ENABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._entries = 0
+        self._bytes = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                );
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access);")
+            self._conn.commit()
+            self._entries, self._bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings;"
+            ).fetchone()
+        return self._conn
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Devuelve los vectores en caché para los hashes dados (los ausentes no aparecen)."""
+        if not self.enabled or not hashes:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            conn = self._get_conn()
+            # SQLite limita los parámetros por sentencia: consultamos por lotes
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders});",
+                    [model, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?;",
+                    [(now, model, text_hash) for text_hash in found],
+                )
+                conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        if not self.enabled or not vectors:
+            return
+        now = time.time()
+        rows = [(model, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now) for text_hash, vector in vectors.items()]
+        with self._lock:
+            conn = self._get_conn()
+            # El vector de un (modelo, hash) no cambia: las filas ya presentes se ignoran
+            for row in rows:
+                if conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?);", row
+                ).rowcount:
+                    self._entries += 1
+                    self._bytes += len(row[2])
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        victims = []
+        freed = 0
+        for rowid, size in conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access ASC;"):
+            if self._entries - len(victims) <= self.max_entries and self._bytes - freed <= self.max_bytes:
+                break
+            victims.append((rowid,))
+            freed += size
+        conn.executemany("DELETE FROM embeddings WHERE rowid = ?;", victims)
+        self._entries -= len(victims)
+        self._bytes -= freed
+
+    def stats(self) -> Dict[str, int]:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": self._entries, "bytes": self._bytes}
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,97 @@
+"""
+Servicio de embeddings compartido por todos los workers de la API en un mismo nodo.
+
+Uso:
+    python -m app.services.embedding_server [--socket /tmp/cmp-embeddings.sock] [--backend onnx-int8]
+
+Carga un único modelo (EMBEDDING_SERVER_BACKEND) y atiende por socket Unix; las peticiones concurrentes
+de distintos workers se agrupan en micro-batches con `BatchingEncoder`. Los workers lo usan con
+EMBEDDING_BACKEND="remote" (ver `RemoteEmbeddingEngine` para el protocolo).
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+
+import numpy as np
+
+from app.config.settings import *
+from app.services.embeddings import BatchingEncoder, get_embedding_engine, recv_frame, send_frame
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Atiende una conexión persistente: múltiples peticiones hasta que el cliente la cierra."""
+
+    def handle(self):
+        encoder: BatchingEncoder = self.server.encoder
+        while True:
+            frame = recv_frame(self.request)
+            if frame is None:
+                return
+            try:
+                message = json.loads(frame)
+                op = message.get("op")
+                if op == "info":
+                    send_frame(self.request, json.dumps({
+                        "ok": True,
+                        "model_name": encoder.engine.model_name,
+                        "cache_key": encoder.cache_key,
+                        "dimension": encoder.dimension,
+                        "backend": encoder.engine.backend,
+                    }).encode("utf-8"))
+                elif op == "encode":
+                    vectors = np.ascontiguousarray(encoder.encode(message["texts"]), dtype=np.float32)
+                    send_frame(self.request, json.dumps({"ok": True, "shape": list(vectors.shape)}).encode("utf-8"))
+                    send_frame(self.request, vectors.tobytes())
+                else:
+                    raise ValueError(f"Operación desconocida: {op}")
+            except Exception as e:
+                print(f"❌ Error atendiendo petición de embeddings: {e}")
+                send_frame(self.request, json.dumps({"ok": False, "error": str(e)}).encode("utf-8"))
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, encoder: BatchingEncoder):
+        # Un socket huérfano de una ejecución anterior impediría el bind
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.socket_path = socket_path
+        self.encoder = encoder
+
+    def server_close(self):
+        super().server_close()
+        self.encoder.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de embeddings por socket Unix")
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET, help="Ruta del socket Unix")
+    parser.add_argument("--backend", default=EMBEDDING_SERVER_BACKEND, help="Backend del modelo (torch, onnx, onnx-int8)")
+    args = parser.parse_args()
+
+    if args.backend == "remote":
+        parser.error("El servicio necesita un backend local (torch, onnx u onnx-int8)")
+
+    encoder = BatchingEncoder(get_embedding_engine(args.backend))
+    server = EmbeddingServer(args.socket, encoder)
+    # SIGTERM se trata como Ctrl+C: shutdown() desde el mismo hilo de serve_forever bloquearía
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"🚀 Servicio de embeddings ({args.backend}, dim={encoder.dimension}) escuchando en {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Servicio de embeddings detenido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import json
+import platform
+import queue
+import socket
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+from app.config.settings import *
+
+
+class EmbeddingEngine(ABC):
+    """
+    Motor de embeddings de texto. `encode` recibe una lista de textos y devuelve una matriz
+    float32 (n, dimension) con vectores normalizados (L2), como all-MiniLM-L6-v2 en sentence-transformers.
+    `cache_key` identifica modelo + backend para las cachés de vectores.
+    `EMBEDDING_BACKEND` elige entre torch, onnx, onnx-int8 (en proceso) o remote (servicio compartido).
+    """
+    backend = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.cache_key = model_name
+        self.dimension: int = 0
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class TorchEmbeddingEngine(EmbeddingEngine):
+    """Backend original: SentenceTransformer sobre PyTorch (CPU)."""
+    backend = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, intra_op_threads: int = EMBEDDING_INTRA_OP_THREADS):
+        super().__init__(model_name)
+        # Import perezoso: el backend ONNX no necesita cargar torch
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if intra_op_threads > 0:
+            torch.set_num_threads(intra_op_threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
+
+
+# Variantes int8 publicadas por sentence-transformers, de la más a la menos exigente con la CPU
+_INT8_FILES_X86 = [
+    ("avx512_vnni", "onnx/model_qint8_avx512_vnni.onnx"),
+    ("avx512f", "onnx/model_qint8_avx512.onnx"),
+    ("avx2", "onnx/model_quint8_avx2.onnx"),
+]
+_INT8_FILE_ARM64 = "onnx/model_qint8_arm64.onnx"
+
+
+def _cpu_flags() -> set[str]:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def select_int8_onnx_file() -> str:
+    """
+    Archivo int8 para esta CPU: EMBEDDING_ONNX_INT8_FILE si está definido; si no, la variante
+    cuantizada que soporta el procesador, o el modelo fp32 (EMBEDDING_ONNX_FILE) si no hay ninguna.
+    """
+    if EMBEDDING_ONNX_INT8_FILE:
+        return EMBEDDING_ONNX_INT8_FILE
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return _INT8_FILE_ARM64
+    flags = _cpu_flags()
+    for flag, onnx_file in _INT8_FILES_X86:
+        if flag in flags:
+            return onnx_file
+    print(f"⚠️ La CPU ({machine}) no soporta AVX2/AVX-512: se usa el modelo ONNX fp32")
+    return EMBEDDING_ONNX_FILE
+
+
+class OnnxEmbeddingEngine(EmbeddingEngine):
+    """
+    Backend ONNX Runtime sin torch: tokenizers + sesión ONNX del mismo modelo (fp32 o cuantizado int8),
+    con mean pooling y normalización L2 equivalentes a sentence-transformers.
+    """
+    backend = "onnx"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, onnx_file: str = EMBEDDING_ONNX_FILE,
+                 intra_op_threads: int = EMBEDDING_INTRA_OP_THREADS, max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.cache_key = f"{model_name}@{onnx_file}"
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(hf_hub_download(repo_id, onnx_file), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = int(self.encode(["dimension"]).shape[1])
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+# Protocolo del servicio de embeddings: cada mensaje es un entero big-endian de 4 bytes con la longitud
+# seguido del cuerpo. Petición: JSON. Respuesta: JSON y, para "encode", un segundo mensaje con la matriz float32.
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Lee un mensaje completo; devuelve None si el otro extremo cerró la conexión."""
+    header = _recv_exact(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = _FRAME_HEADER.unpack(header)
+    return _recv_exact(sock, length)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+class RemoteEmbeddingEngine(EmbeddingEngine):
+    """
+    Cliente del servicio de embeddings (`python -m app.services.embedding_server`) por socket Unix.
+    Un único modelo atiende a todos los workers de la API; cada hilo mantiene su propia conexión.
+    """
+    backend = "remote"
+
+    def __init__(self, socket_path: str = EMBEDDING_SERVER_SOCKET, timeout: float = EMBEDDING_SERVER_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        info = self._request({"op": "info"})[0]
+        super().__init__(info["model_name"])
+        # Misma clave de caché que el backend del servidor: los vectores son los mismos
+        self.cache_key = info["cache_key"]
+        self.dimension = int(info["dimension"])
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _request(self, message: dict) -> tuple[dict, Optional[bytes]]:
+        # Un reintento con conexión nueva solo si la conexión falló (p. ej. el servidor se reinició).
+        # Tras un timeout el servidor puede seguir codificando la petición: reintentar duplicaría el trabajo.
+        for intento in range(2):
+            try:
+                sock = self._connection()
+                send_frame(sock, json.dumps(message).encode("utf-8"))
+                header = recv_frame(sock)
+                if header is None:
+                    raise ConnectionError("El servicio de embeddings cerró la conexión")
+                response = json.loads(header)
+                if not response.get("ok"):
+                    raise RuntimeError(f"Error en el servicio de embeddings: {response.get('error')}")
+                body = recv_frame(sock) if "shape" in response else None
+                return response, body
+            except (ConnectionError, FileNotFoundError):
+                self._reset()
+                if intento == 1:
+                    raise
+            except OSError:
+                # Timeout u otro error de E/S: la conexión queda en un estado desconocido y no se reintenta
+                self._reset()
+                raise
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        response, body = self._request({"op": "encode", "texts": list(texts)})
+        return np.frombuffer(body, dtype=np.float32).reshape(response["shape"])
+
+
+def get_embedding_engine(backend: Optional[str] = None, model_name: str = EMBEDDING_MODEL_NAME) -> EmbeddingEngine:
+    """Construye el motor configurado en EMBEDDING_BACKEND (o el indicado); "remote" usa el servicio por socket."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "torch":
+        return TorchEmbeddingEngine(model_name)
+    if backend == "onnx":
+        return OnnxEmbeddingEngine(model_name, onnx_file=EMBEDDING_ONNX_FILE)
+    if backend == "onnx-int8":
+        return OnnxEmbeddingEngine(model_name, onnx_file=select_int8_onnx_file())
+    if backend == "remote":
+        return RemoteEmbeddingEngine(EMBEDDING_SERVER_SOCKET)
+    raise ValueError(f"Backend de embeddings desconocido: '{backend}'. Disponibles: torch, onnx, onnx-int8, remote")
+
+
+class _EncodeRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class BatchingEncoder:
+    """
+    Ejecuta la inferencia en hilos dedicados y agrupa en micro-batches (hasta `batch_size` textos,
+    esperando como mucho `max_wait_ms`) las peticiones que llegan a la vez desde distintos requests.
+    """
+
+    def __init__(self, engine: EmbeddingEngine, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS, workers: int = EMBEDDING_WORKERS):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[_EncodeRequest]]" = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"embeddings-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def dimension(self) -> int:
+        return self.engine.dimension
+
+    @property
+    def cache_key(self) -> str:
+        return self.engine.cache_key
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Codifica (bloqueante) una lista de textos a través del pool de inferencia."""
+        if not texts:
+            return np.zeros((0, self.engine.dimension), dtype=np.float32)
+        request = _EncodeRequest(list(texts))
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self, first: _EncodeRequest) -> List[_EncodeRequest]:
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.put(None)
+                return
+            batch = self._collect(first)
+            texts = [text for request in batch for text in request.texts]
+            try:
+                # Se respeta batch_size también dentro de una misma petición grande
+                vectors = np.concatenate([
+                    self.engine.encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)
+                ])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+    def close(self):
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
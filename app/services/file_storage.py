@@ -1,9 +1,10 @@
-import hashlib
+from azure.core.exceptions import ResourceExistsError
 from azure.storage.blob import BlobServiceClient
-import os
 from typing import Tuple
+from urllib.parse import quote
 
 from app.config.settings import *
+from app.types import StoredDocument
 
 
 class BlobStorage:
@@ -12,37 +13,45 @@ class BlobStorage:
         self.container_name = AZURE_STORAGE_CONTAINER_NAME
         self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
         self.container_client = self.blob_service_client.get_container_client(self.container_name)
+        # Claves de blobs que sabemos que existen (subidos por este proceso o rechazados por duplicados)
+        self._known_blobs: set[str] = set()
 
-    def generar_hash_pdf(self, file_path: str, num_bytes: int = 500) -> str:
-        with open(file_path, 'rb') as f:
-            data = f.read(num_bytes)
-        return hashlib.sha1(data).hexdigest()
+    @staticmethod
+    def blob_name_for(file_hash: str, fuente: str) -> str:
+        """Nombre direccionado por contenido: el SHA-256 del pipeline (el mismo de Qdrant y PostgreSQL)."""
+        return f"{fuente}/{file_hash}.pdf"
 
-    def existe_blob_con_hash(self, hash_val: str, fuente: str) -> bool:
-        blob_prefix = f"{fuente}/"
-        for blob in self.container_client.list_blobs(name_starts_with=blob_prefix):
-            if hash_val in blob.name:
-                return True
-        return False
+    @staticmethod
+    def blob_metadata(nombre_archivo: str) -> dict:
+        """Metadatos del blob. Azure solo admite ASCII, así que el nombre original se guarda percent-encoded."""
+        return {"nombre_original": quote(nombre_archivo)}
 
-    def upload_file(self, file_path: str, fuente: str) -> Tuple[bool, str]:
+    def upload_file(self, document: StoredDocument, fuente: str) -> Tuple[bool, str]:
         """
-        Sube un archivo al blob storage si no existe.
+        Sube un documento al blob storage si no existe, usando una subida condicional
+        (falla si el blob ya existe) en lugar de listar el contenedor. Lee directamente
+        del buffer en memoria del documento (o de su archivo si está volcado a disco).
         Returns: (éxito, mensaje)
         """
-        try:
-            hash_val = self.generar_hash_pdf(file_path)
-            blob_prefix = f"{fuente}/"
-            blob_name = f"{blob_prefix}{hash_val}_{os.path.basename(file_path)}"
-
-            if self.existe_blob_con_hash(hash_val, fuente):
-                return False, "El archivo ya existe en el storage"
+        blob_name = self.blob_name_for(document.hash, fuente)
+        if blob_name in self._known_blobs:
+            return False, "El archivo ya existe en el storage"
 
+        try:
             blob_client = self.container_client.get_blob_client(blob_name)
-            with open(file_path, "rb") as data:
-                blob_client.upload_blob(data, overwrite=False)
+            with document.open_stream() as data:
+                blob_client.upload_blob(
+                    data,
+                    length=document.size,
+                    overwrite=False,
+                    metadata=self.blob_metadata(document.nombre_archivo)
+                )
+            self._known_blobs.add(blob_name)
             return True, f"Archivo subido exitosamente como {blob_name}"
 
+        except ResourceExistsError:
+            self._known_blobs.add(blob_name)
+            return False, "El archivo ya existe en el storage"
         except Exception as e:
             return False, f"Error subiendo archivo: {str(e)}"
 
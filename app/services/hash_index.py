@@ -0,0 +1,47 @@
+import threading
+from typing import Iterable
+
+
+class HashIndex:
+    """
+    Índice en memoria de hashes SHA-256 de documentos ya procesados.
+    Permite rechazar duplicados antes de cualquier llamada a LLM, Qdrant o Blob Storage.
+    La fuente de verdad sigue siendo el índice único de `documentos.hash_documento` en PostgreSQL.
+    """
+
+    def __init__(self):
+        self._hashes: set[str] = set()
+        self._in_flight: set[str] = set()
+        self._lock = threading.Lock()
+
+    def warm(self, hashes: Iterable[str]) -> int:
+        """Carga los hashes conocidos (normalmente desde PostgreSQL al iniciar)."""
+        with self._lock:
+            self._hashes.update(h for h in hashes if h)
+            return len(self._hashes)
+
+    def contains(self, doc_hash: str) -> bool:
+        return doc_hash in self._hashes or doc_hash in self._in_flight
+
+    def claim(self, doc_hash: str) -> bool:
+        """Reserva un hash para procesarlo. Devuelve False si ya es conocido o está en proceso."""
+        with self._lock:
+            if doc_hash in self._hashes or doc_hash in self._in_flight:
+                return False
+            self._in_flight.add(doc_hash)
+            return True
+
+    def release(self, doc_hash: str):
+        """Libera la reserva de un hash al terminar su procesamiento (con o sin éxito)."""
+        with self._lock:
+            self._in_flight.discard(doc_hash)
+
+    def add(self, doc_hash: str):
+        with self._lock:
+            self._hashes.add(doc_hash)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+hash_index = HashIndex()
@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.config.settings import *
+
+
+class LogSink:
+    """
+    Cola en memoria para los logs de monitoreo (`logs_procesamiento`, `logs_tareas`).
+    Un hilo en segundo plano los escribe por lotes cuando se alcanza `batch_size`
+    eventos o pasan `flush_interval` segundos, fuera del camino crítico de la ingesta.
+    La cola está acotada: si se llena, los eventos nuevos se descartan y se contabilizan.
+    """
+
+    def __init__(self, writer: Callable[[str, List[tuple]], bool], max_size: int = LOG_BUFFER_MAX,
+                 batch_size: int = LOG_FLUSH_BATCH, flush_interval: float = LOG_FLUSH_INTERVAL):
+        self._writer = writer
+        self._queue: "queue.Queue[Tuple[str, tuple]]" = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                    self._thread.start()
+
+    def enqueue(self, tabla: str, row: tuple):
+        """Encola un evento sin bloquear. Si la cola está llena, el evento se descarta."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((tabla, row))
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, max_items: int) -> Dict[str, List[tuple]]:
+        batch: Dict[str, List[tuple]] = {}
+        for _ in range(max_items):
+            try:
+                tabla, row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.setdefault(tabla, []).append(row)
+        return batch
+
+    def _write(self, batch: Dict[str, List[tuple]]):
+        for tabla, rows in batch.items():
+            if self._writer(tabla, rows):
+                self.written += len(rows)
+            else:
+                self.dropped += len(rows)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            elapsed = time.monotonic() - last_flush
+            if self._queue.qsize() >= self.batch_size or (elapsed >= self.flush_interval and not self._queue.empty()):
+                self._write(self._drain(self.batch_size))
+                last_flush = time.monotonic()
+            else:
+                self._stop.wait(min(0.1, self.flush_interval))
+
+    def flush(self):
+        """Escribe todo lo pendiente de forma síncrona."""
+        while not self._queue.empty():
+            self._write(self._drain(self.batch_size))
+
+    def close(self):
+        """Detiene el hilo y vacía la cola (se llama al cerrar la aplicación)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        if self.dropped:
+            print(f"⚠️ Se descartaron {self.dropped} eventos de log por buffer lleno o errores de escritura.")
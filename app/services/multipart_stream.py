@@ -0,0 +1,98 @@
+from typing import AsyncIterator, Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # versiones antiguas de python-multipart
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class MultipartFileStream:
+    """
+    Lee un campo de archivo de un cuerpo multipart/form-data a medida que llegan los bloques
+    de la petición, sin que Starlette vuelque antes el formulario completo a disco o memoria.
+    Los datos de otros campos se descartan. `filename` y `content_type` quedan disponibles
+    en cuanto se han leído las cabeceras de la parte.
+    """
+
+    def __init__(self, content_type_header: str, field_name: str = "file"):
+        _, options = parse_options_header(content_type_header)
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise ValueError("Falta el boundary en la cabecera Content-Type multipart")
+        self.field_name = field_name
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.found = False
+        self._in_field = False
+        self._headers: dict[str, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._pending: list[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        field = self._header_field.decode("latin-1").lower()
+        self._headers[field] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get("content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if name != self.field_name or self.found or b"filename" not in options:
+            return
+        self.found = True
+        self._in_field = True
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        content_type = self._headers.get("content-type")
+        self.content_type = content_type.decode("latin-1") if content_type is not None else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_field:
+            self._pending.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        self._in_field = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Procesa un bloque del cuerpo y devuelve los bytes del archivo que contenía (puede ser una lista vacía)."""
+        self._parser.write(chunk)
+        data, self._pending = self._pending, []
+        return data
+
+    def finalize(self):
+        self._parser.finalize()
+
+    async def iter_file(self, body: AsyncIterator[bytes], max_body_bytes: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Recorre el cuerpo de la petición y produce los bytes del archivo conforme se parsean.
+        Lanza OverflowError si el cuerpo completo supera `max_body_bytes`.
+        """
+        body_size = 0
+        async for chunk in body:
+            body_size += len(chunk)
+            if max_body_bytes is not None and body_size > max_body_bytes:
+                raise OverflowError(f"El cuerpo supera el máximo de {max_body_bytes} bytes")
+            for data in self.feed(chunk):
+                yield data
+        self.finalize()
+        for data in self._pending:
+            yield data
+        self._pending = []
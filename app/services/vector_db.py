@@ -1,9 +1,13 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
 import qdrant_client
 from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
-
 
 from app.config.settings import *
+from app.services.embedding_cache import embedding_cache
+from app.services.embeddings import BatchingEncoder, get_embedding_engine
 
 class QdrantManager:
     def __init__(self):
@@ -11,20 +15,103 @@ class QdrantManager:
             url=QDRANT_URL, 
             api_key=QDRANT_API_KEY,
         )
-        # Usar un modelo de embedding más ligero y rápido si es posible
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.vector_size = self.embedding_model.get_sentence_embedding_dimension()
+        # Motor de embeddings configurable (torch / onnx / onnx-int8), con inferencia micro-batch en hilos propios
+        self.embedder = BatchingEncoder(get_embedding_engine(EMBEDDING_BACKEND))
+        # Clave de caché: distingue backends cuyos vectores no son bit a bit idénticos
+        self.model_name = self.embedder.cache_key
+        self.vector_size = self.embedder.dimension
+        # Vectores de consultas estáticas (TASK_REGISTRY), precalculados una sola vez
+        self._static_query_vectors: dict[tuple[str, str], list[float]] = {}
+        # Consultas ad-hoc: LRU acotado
+        self._query_lru: "OrderedDict[tuple[str, str], list[float]]" = OrderedDict()
+        self._query_lock = threading.Lock()
+        # Colecciones ya verificadas (existencia + índices) en este proceso
+        self._ready_collections: set[str] = set()
+        self._collections_lock = threading.Lock()
+
+    def precompute_queries(self, queries: Iterable[str]) -> int:
+        """Codifica en un solo batch las consultas estáticas que aún no están en caché."""
+        pendientes = list(dict.fromkeys(q for q in queries if (self.model_name, q) not in self._static_query_vectors))
+        if pendientes:
+            vectors = self.embedder.encode(pendientes)
+            with self._query_lock:
+                for query, vector in zip(pendientes, vectors):
+                    self._static_query_vectors[(self.model_name, query)] = vector.tolist()
+        return len(self._static_query_vectors)
+
+    def encode_query(self, query_text: str) -> list[float]:
+        """Devuelve el vector de una consulta usando la caché estática o el LRU de consultas ad-hoc."""
+        key = (self.model_name, query_text)
+        vector = self._static_query_vectors.get(key)
+        if vector is not None:
+            return vector
+        with self._query_lock:
+            vector = self._query_lru.get(key)
+            if vector is not None:
+                self._query_lru.move_to_end(key)
+                return vector
+        vector = self.embedder.encode([query_text])[0].tolist()
+        with self._query_lock:
+            self._query_lru[key] = vector
+            while len(self._query_lru) > QUERY_CACHE_SIZE:
+                self._query_lru.popitem(last=False)
+        return vector
+
+    # Índices de payload usados por los filtros de deduplicación y búsqueda
+    PAYLOAD_INDEXES = {
+        "document_hash": models.PayloadSchemaType.KEYWORD,
+        "document_date": models.PayloadSchemaType.DATETIME,
+        "chunk_index": models.PayloadSchemaType.INTEGER,
+        "page": models.PayloadSchemaType.INTEGER,
+        "source": models.PayloadSchemaType.KEYWORD,
+        "page_hash": models.PayloadSchemaType.KEYWORD,
+    }
 
     def get_or_create_collection(self, collection_name: str):
-        try:
-            self.client.get_collection(collection_name=collection_name)
-            print(f"Colección '{collection_name}' ya existe.")
-        except Exception:
-            print(f"Creando colección '{collection_name}'...")
-            self.client.recreate_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(size=self.vector_size, distance=models.Distance.COSINE),
-            )
+        """
+        Garantiza que la colección exista con su configuración e índices de payload.
+        Nunca borra una colección existente; solo añade los índices que falten.
+        """
+        if collection_name in self._ready_collections:
+            return
+        with self._collections_lock:
+            if collection_name in self._ready_collections:
+                return
+            if self.client.collection_exists(collection_name=collection_name):
+                print(f"Colección '{collection_name}' ya existe.")
+            else:
+                print(f"Creando colección '{collection_name}'...")
+                quantization_config = None
+                if QDRANT_SCALAR_QUANTIZATION:
+                    quantization_config = models.ScalarQuantization(
+                        scalar=models.ScalarQuantizationConfig(
+                            type=models.ScalarType.INT8,
+                            quantile=QDRANT_QUANTIZATION_QUANTILE,
+                            always_ram=True,
+                        )
+                    )
+                self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=models.VectorParams(size=self.vector_size, distance=models.Distance.COSINE),
+                    hnsw_config=models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+                    on_disk_payload=QDRANT_ON_DISK_PAYLOAD,
+                    quantization_config=quantization_config,
+                )
+            self.ensure_payload_indexes(collection_name)
+            self._ready_collections.add(collection_name)
+
+    def ensure_payload_indexes(self, collection_name: str):
+        """Crea los índices de payload que aún no existan en la colección."""
+        existing = self.client.get_collection(collection_name=collection_name).payload_schema or {}
+        for field_name, schema in self.PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                print(f"Creando índice de payload '{field_name}' en '{collection_name}'...")
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=schema,
+                    wait=True,
+                )
 
     def check_document_exists(self, collection_name: str, doc_hash: str) -> bool:
         """Verifica si un documento con un hash específico ya ha sido procesado."""
@@ -48,22 +135,80 @@ class QdrantManager:
             # Si la colección no existe o hay otro error, asumimos que no existe.
             return False
 
-    def upsert_chunks(self, collection_name: str, chunks: list[str], metadata: list[dict], ids: list[str]):
-        embeddings = self.embedding_model.encode(chunks, show_progress_bar=True)
+    def embed_chunks(self, chunks: list[str]) -> tuple[list[list[float]], int]:
+        """
+        Codifica los chunks reutilizando la caché persistente de embeddings: solo los textos
+        nuevos llegan al modelo. Devuelve los vectores y cuántos salieron de la caché.
+        """
+        hashes = [embedding_cache.text_hash(chunk) for chunk in chunks]
+        cached = embedding_cache.get_many(self.model_name, hashes)
+
+        pendientes = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if pendientes:
+            text_by_hash = dict(zip(hashes, chunks))
+            encoded = self.embedder.encode([text_by_hash[h] for h in pendientes])
+            nuevos = dict(zip(pendientes, encoded))
+            embedding_cache.put_many(self.model_name, nuevos)
+            cached.update(nuevos)
+
+        reutilizados = sum(1 for h in hashes if h not in pendientes)
+        return [cached[h].tolist() for h in hashes], reutilizados
+
+    def get_page_points(self, collection_name: str, doc_hash: str, pages: list[int], index_version: str) -> list:
+        """
+        Puntos (payload + vector) de ciertas páginas de un documento ya indexado con la misma
+        versión de índice (modelo + chunking), para reutilizarlos sin volver a chunkear ni codificar.
+        """
+        if not pages:
+            return []
+        scroll_filter = models.Filter(
+            must=[
+                models.FieldCondition(key="document_hash", match=models.MatchValue(value=doc_hash)),
+                models.FieldCondition(key="page", match=models.MatchAny(any=pages)),
+                models.FieldCondition(key="index_version", match=models.MatchValue(value=index_version)),
+            ]
+        )
+        points, offset = [], None
+        while True:
+            batch, offset = self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=scroll_filter,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            points.extend(batch)
+            if offset is None:
+                return points
+
+    def upsert_chunks(self, collection_name: str, chunks: list[str], metadata: list[dict], ids: list[str],
+                      reused_vectors: Optional[dict[int, list[float]]] = None) -> int:
+        """
+        Indexa los chunks y devuelve cuántos embeddings se reutilizaron de la caché.
+        Los índices presentes en `reused_vectors` usan ese vector directamente (p. ej. páginas sin cambios).
+        """
+        reused_vectors = reused_vectors or {}
+        pendientes = [i for i in range(len(chunks)) if i not in reused_vectors]
+        nuevos, reutilizados = self.embed_chunks([chunks[i] for i in pendientes]) if pendientes else ([], 0)
+        vectors_por_indice = dict(reused_vectors)
+        vectors_por_indice.update(zip(pendientes, nuevos))
+        vectors = [vectors_por_indice[i] for i in range(len(chunks))]
         
         self.client.upsert(
             collection_name=collection_name,
             points=models.Batch(
                 ids=ids,
-                vectors=embeddings.tolist(),
+                vectors=vectors,
                 payloads=metadata
             ),
             wait=True
         )
-        print(f"Upsert de {len(chunks)} chunks completado.")
+        print(f"Upsert de {len(chunks)} chunks completado ({reutilizados} embeddings desde caché, {len(reused_vectors)} de páginas sin cambios).")
+        return reutilizados
 
     def search(self, collection_name: str, query_text: str, top_k: int = 5) -> list[dict]:
-        query_vector = self.embedding_model.encode(query_text).tolist()
+        query_vector = self.encode_query(query_text)
         
         search_result = self.client.search(
             collection_name=collection_name,
@@ -73,4 +218,34 @@ class QdrantManager:
         )
         
         # Extraer solo el contenido del payload
-        return [hit.payload for hit in search_result] 
\ No newline at end of file
+        return [hit.payload for hit in search_result]
+
+    def search_batch(self, collection_name: str, queries: list[str], doc_hash: str = None, top_k: int = 5) -> list[dict]:
+        """
+        Ejecuta todas las consultas en una sola llamada `search_batch` de Qdrant, opcionalmente
+        filtradas por `document_hash`. Fusiona los resultados por punto (se queda con el mejor score)
+        y los devuelve ordenados por score descendente, con el score añadido al payload.
+        """
+        if not queries:
+            return []
+
+        query_filter = None
+        if doc_hash:
+            query_filter = models.Filter(
+                must=[models.FieldCondition(key="document_hash", match=models.MatchValue(value=doc_hash))]
+            )
+
+        requests = [
+            models.SearchRequest(vector=self.encode_query(query), filter=query_filter, limit=top_k, with_payload=True)
+            for query in queries
+        ]
+        batch_results = self.client.search_batch(collection_name=collection_name, requests=requests)
+
+        best_hits: dict = {}
+        for hits in batch_results:
+            for hit in hits:
+                if hit.id not in best_hits or hit.score > best_hits[hit.id].score:
+                    best_hits[hit.id] = hit
+
+        ranked = sorted(best_hits.values(), key=lambda hit: hit.score, reverse=True)
+        return [{**hit.payload, "score": hit.score} for hit in ranked]
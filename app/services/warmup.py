@@ -0,0 +1,123 @@
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import *
+
+
+class Warmup:
+    """
+    Fase de warm-up ejecutada en segundo plano tras el arranque: la app acepta tráfico
+    (liveness) de inmediato y reporta `ready` solo cuando todos los pasos terminaron.
+    Cada paso se reintenta con backoff exponencial (PostgreSQL, Blob Storage o el servicio de
+    embeddings pueden tardar en estar disponibles al arrancar); si agota los intentos el warm-up
+    queda en `failed` hasta que `retry` lo relance desde ese paso.
+    Estados: pending -> warming -> ready | failed.
+    """
+
+    def __init__(self, attempts: int = WARMUP_STEP_ATTEMPTS, backoff_seconds: float = WARMUP_BACKOFF_SECONDS,
+                 backoff_max_seconds: float = WARMUP_BACKOFF_MAX_SECONDS):
+        self.attempts = max(1, attempts)
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.estado = "pending"
+        self.error: Optional[str] = None
+        self.iniciado: Optional[datetime] = None
+        self.finalizado: Optional[datetime] = None
+        self._pasos: Dict[str, Dict[str, Any]] = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._failed_index = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """Lanza los pasos, en orden, en un hilo propio. Cada paso puede devolver un detalle para el reporte."""
+        with self._lock:
+            self._steps = list(steps)
+            self.estado = "warming"
+            self.iniciado = datetime.utcnow()
+            self._pasos = {name: {"estado": "pending"} for name, _ in steps}
+        self._launch(0)
+
+    def retry(self) -> bool:
+        """Relanza en segundo plano un warm-up fallido desde el paso que falló. Devuelve False si no estaba en `failed`."""
+        with self._lock:
+            if self.estado != "failed" or (self._thread is not None and self._thread.is_alive()):
+                return False
+            self.estado = "warming"
+            self.error = None
+            self.finalizado = None
+        print(f"🔁 Reintentando el warm-up desde '{self._steps[self._failed_index][0]}'")
+        self._launch(self._failed_index)
+        return True
+
+    def _launch(self, first_step: int):
+        self._thread = threading.Thread(target=self._run, args=(first_step,), name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run_step(self, name: str, step: Callable[[], Any]) -> Any:
+        """Ejecuta un paso con reintentos y backoff exponencial; relanza el último error si se agotan."""
+        delay = self.backoff_seconds
+        for intento in range(1, self.attempts + 1):
+            try:
+                return step()
+            except Exception as e:
+                if intento == self.attempts:
+                    raise
+                print(f"⚠️ Warm-up '{name}' falló (intento {intento}/{self.attempts}): {e}. Reintento en {delay:.0f}s")
+                with self._lock:
+                    self._pasos[name].update(estado="retrying", intentos=intento, ultimo_error=str(e))
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max_seconds)
+
+    def _run(self, first_step: int):
+        for index, (name, step) in enumerate(self._steps[first_step:], start=first_step):
+            with self._lock:
+                self._pasos[name]["estado"] = "running"
+            start = time.perf_counter()
+            try:
+                detalle = self._run_step(name, step)
+            except Exception as e:
+                print(f"❌ Warm-up falló en '{name}': {e}")
+                traceback.print_exc()
+                with self._lock:
+                    self._pasos[name].update(estado="failed", segundos=round(time.perf_counter() - start, 3))
+                    self.estado = "failed"
+                    self.error = f"{name}: {e}"
+                    self.finalizado = datetime.utcnow()
+                    self._failed_index = index
+                return
+            with self._lock:
+                self._pasos[name].update(estado="done", segundos=round(time.perf_counter() - start, 3))
+                if detalle is not None:
+                    self._pasos[name]["detalle"] = detalle
+            print(f"✅ Warm-up '{name}' completado en {self._pasos[name]['segundos']}s")
+
+        with self._lock:
+            self.estado = "ready"
+            self.finalizado = datetime.utcnow()
+        self._ready.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "ready": self.is_ready,
+                "error": self.error,
+                "iniciado": self.iniciado.isoformat() if self.iniciado else None,
+                "finalizado": self.finalizado.isoformat() if self.finalizado else None,
+                "pasos": {name: dict(paso) for name, paso in self._pasos.items()},
+            }
+
+
+warmup = Warmup()
@@ -8,6 +8,14 @@ CREATE TABLE documentos (
     hash_documento VARCHAR(64) UNIQUE
 );
 
+-- Huellas por página (SHA-256 del texto normalizado) para la ingesta incremental entre reportes de una misma fuente
+CREATE TABLE IF NOT EXISTS paginas_documento (
+    documento_id INTEGER REFERENCES documentos(id),
+    pagina INTEGER NOT NULL, -- 1-indexada
+    hash_pagina VARCHAR(64) NOT NULL,
+    PRIMARY KEY (documento_id, pagina)
+);
+
 -- Tabla para inventarios Mysteel
 CREATE TABLE inventarios (
     id SERIAL PRIMARY KEY,
@@ -106,6 +114,7 @@ CREATE TABLE logs_tareas (
 
 -- Índices para mejorar el rendimiento
 CREATE INDEX idx_documentos_fuente ON documentos(fuente);
+CREATE INDEX IF NOT EXISTS idx_paginas_documento_hash ON paginas_documento(hash_pagina);
 CREATE INDEX idx_noticias_fecha ON noticias(fecha_noticia);
 CREATE INDEX idx_noticias_fuente ON noticias(fuente);
 CREATE INDEX idx_precios_fecha ON precios(fecha_precio);
@@ -0,0 +1,15 @@
+from typing import BinaryIO, Protocol
+
+
+class StoredDocument(Protocol):
+    """
+    Lo que los servicios de almacenamiento necesitan de un documento subido: su hash,
+    tamaño, nombre original y un stream de lectura. `app.pipeline.document.ParsedDocument`
+    lo cumple; definirlo aquí evita que los servicios dependan del código del pipeline.
+    """
+    hash: str
+    size: int
+    nombre_archivo: str
+
+    def open_stream(self) -> BinaryIO:
+        ...
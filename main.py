@@ -1,22 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import tempfile
-import os
+from fastapi.concurrency import run_in_threadpool
 import json
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional
 import logging
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
 import base64
 import hashlib
 from app.config.settings import *
-from app.services.file_storage import BlobStorage
-from app.services.vector_db import QdrantManager
-from app.ai.classify import classify_with_ai
+from app.services.db_manager import db_manager
+from app.services.hash_index import hash_index
+from app.services.multipart_stream import MultipartFileStream
+from app.services.warmup import warmup
+from app.ai.classify import classify_document
+from app.ai.llm_cache import llm_cache
+from app.ai.llm_gateway import llm_gateway
 from app.ai.extract_text import extract_first_page_text
-from app.pipeline.task import process_pdf_automatically
+from app.pipeline.document import ParsedDocument, SpillBuffer
+from app.pipeline.text_engines import TEXT_ENGINES
+from app.pipeline.jobs import job_manager, JobQueueFullError
+from app.pipeline.task import process_pdf_automatically, registry_search_queries
 from app.pipeline.utils import sanitize_for_logging
 
 # Configurar logging
@@ -32,27 +38,88 @@ class PDFPayload(BaseModel):
     contentBytes: str  # Contenido del archivo en Base64
     contentType: str
 
-# Crear instancia global de BlobStorage
+# Instancias globales, creadas durante el warm-up
 blob_storage = None
-qdrant_manager = None  # Nueva variable global
+qdrant_manager = None
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Código que se ejecuta al iniciar
+def init_blob_storage():
     global blob_storage
+    # Import perezoso: el SDK de Azure se carga en el warm-up, no al importar la app
+    from app.services.file_storage import BlobStorage
+    blob_storage = BlobStorage()
+
+def init_qdrant():
+    """Conecta con Qdrant y carga el modelo de embeddings (o conecta con el servicio compartido)."""
     global qdrant_manager
+    from app.services.vector_db import QdrantManager
+    qdrant_manager = QdrantManager()
+    return {"backend": EMBEDDING_BACKEND, "modelo": qdrant_manager.model_name}
+
+def precompute_queries():
+    total_queries = qdrant_manager.precompute_queries(registry_search_queries())
+    return {"consultas": total_queries}
+
+def warm_db_pool():
+    if not db_manager.warm_pool():
+        raise RuntimeError("No se pudo abrir el pool de PostgreSQL")
+    if not db_manager.ensure_schema():
+        raise RuntimeError("No se pudo migrar el esquema de PostgreSQL")
+    total_hashes = hash_index.warm(db_manager.get_document_hashes())
+    return {"hashes": total_hashes}
+
+def warm_llm_gateway():
+    llm_gateway.start()
+
+def warm_tokenizers():
+    """Carga los tokenizadores (imports perezosos) para que no los pague la primera ingesta."""
+    from app.pipeline.tokens import get_embedding_tokenizer, get_encoding
+    get_encoding()
+    if CHUNK_STRATEGY != "page":
+        get_embedding_tokenizer()
+
+WARMUP_STEPS = [
+    ("db_pool", warm_db_pool),
+    ("blob_storage", init_blob_storage),
+    ("embeddings", init_qdrant),
+    ("query_embeddings", precompute_queries),
+    ("llm_gateway", warm_llm_gateway),
+    ("tokenizers", warm_tokenizers),
+]
+
+# Bytes extra tolerados en un cuerpo multipart sobre UPLOAD_MAX_BYTES (boundaries, cabeceras y campos de texto)
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+def require_ready():
+    """
+    Rechaza con 503 (y Retry-After) las ingestas mientras el warm-up no haya terminado.
+    Si falló, lo relanza desde el paso fallido: un fallo transitorio al arrancar no exige reiniciar el proceso.
+    """
+    if not warmup.is_ready:
+        warmup.retry()
+        raise HTTPException(
+            status_code=503,
+            detail={"mensaje": "La aplicación aún no está lista", "warmup": warmup.snapshot()["estado"]},
+            headers={"Retry-After": str(WARMUP_RETRY_AFTER_SECONDS)},
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Código que se ejecuta al iniciar: el warm-up corre en segundo plano y la app acepta tráfico de inmediato
     logger.info("Iniciando aplicación...")
+    warmup.start(WARMUP_STEPS)
     try:
-        blob_storage = BlobStorage()
-        qdrant_manager = QdrantManager()
-        logger.info("Conexiones a Blob Storage y Qdrant establecidas")
         yield
-    except Exception as e:
-        logger.error(f"Error al iniciar la aplicación: {e}")
-        raise
     finally:
         # Código que se ejecuta al cerrar
         logger.info("Cerrando aplicación...")
+        job_manager.shutdown(wait=True)
+        for engine in TEXT_ENGINES.values():
+            engine.shutdown()
+        if qdrant_manager is not None:
+            qdrant_manager.embedder.close()
+        db_manager.log_sink.close()
+        llm_gateway.close()
+        db_manager.close_pool()
 
 app = FastAPI(
     title="PDF Processor API",
@@ -70,57 +137,131 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def cleanup_temp_file(file_path: str):
-    """Limpia archivos temporales de forma segura"""
-    try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.debug(f"Archivo temporal eliminado: {file_path}")
-    except Exception as e:
-        logger.error(f"Error eliminando archivo temporal {file_path}: {e}")
+def decode_and_claim(payload: PDFPayload) -> ParsedDocument:
+    """
+    Valida y decodifica el payload, y reserva su hash en el índice de duplicados.
+    Lanza 409 si el documento ya es conocido o se está procesando. Es bloqueante
+    (Base64 + SHA-256 de hasta UPLOAD_MAX_BYTES): se llama con `run_in_threadpool`.
+    """
+    require_ready()
+    if "pdf" not in payload.contentType.lower():
+        raise HTTPException(status_code=400, detail="El archivo debe ser un PDF")
+
+    file_content = base64.b64decode(payload.contentBytes)
+    return claim_document(ParsedDocument.from_bytes(file_content, payload.name))
+
+def claim_document(document: ParsedDocument) -> ParsedDocument:
+    """Reserva el hash del documento; si ya es conocido o está en proceso, lo libera y lanza 409."""
+    if not hash_index.claim(document.hash):
+        document.close()
+        raise HTTPException(
+            status_code=409,
+            detail=f"Documento con hash {document.hash[:10]}... ya fue procesado anteriormente."
+        )
+    return document
 
-def get_file_hash(file_path: str) -> str:
-    """Calcula el hash SHA256 de un archivo."""
+def is_pdf_content_type(content_type: str) -> bool:
+    """Los clientes HTTP suelen enviar los archivos como application/octet-stream: se aceptan igual que application/pdf."""
+    content_type = content_type.lower()
+    return "pdf" in content_type or "octet-stream" in content_type
+
+async def receive_streamed_pdf(request: Request) -> ParsedDocument:
+    """
+    Recibe un PDF como cuerpo binario (application/pdf u octet-stream) o multipart (campo 'file'),
+    volcándolo por bloques a un SpillBuffer mientras se calcula el SHA-256 en la misma pasada.
+    El multipart se parsea sobre el stream de la petición (no con `request.form()`), así que el hash
+    y el límite UPLOAD_MAX_BYTES se aplican bloque a bloque en ambos casos (413 si se supera).
+    Solo se usa disco si el PDF supera PDF_IN_MEMORY_MAX_BYTES.
+    """
+    require_ready()
+    content_type = request.headers.get("content-type", "").lower()
+    multipart = None
+    if content_type.startswith("multipart/form-data"):
+        try:
+            multipart = MultipartFileStream(request.headers["content-type"], field_name="file")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        async def chunks():
+            # Margen para el framing multipart y los campos de texto, que se leen pero se descartan
+            async for chunk in multipart.iter_file(request.stream(), max_body_bytes=UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES):
+                if multipart.content_type and not is_pdf_content_type(multipart.content_type):
+                    raise HTTPException(status_code=400, detail="El archivo debe ser un PDF")
+                yield chunk
+        source = chunks()
+    elif is_pdf_content_type(content_type):
+        nombre_archivo = request.headers.get("x-file-name") or request.query_params.get("nombre") or "documento.pdf"
+        source = request.stream()
+    else:
+        raise HTTPException(status_code=400, detail="El archivo debe ser un PDF (application/pdf o multipart/form-data)")
+
+    buffer = SpillBuffer()
     sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+    size = 0
 
-@app.post("/procesar_pdf")
-async def procesar_pdf(payload: PDFPayload) -> Dict[str, Any]:
-    if "pdf" not in payload.contentType.lower():
-        raise HTTPException(status_code=400, detail="El archivo debe ser un PDF")
+    def consume(chunk: bytes):
+        sha256_hash.update(chunk)
+        buffer.write(chunk)
 
-    temp_file_path = None
     try:
-        # 1. Decodificar Base64 y guardar archivo temporalmente
-        file_content = base64.b64decode(payload.contentBytes)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(file_content)
-            temp_file_path = tmp.name
-            logger.info(f"Archivo temporal creado: {temp_file_path}")
-
-        # 2. Clasificar y calcular Hash
-        first_page_text = extract_first_page_text(temp_file_path)
-        classification = classify_with_ai(first_page_text)
-        file_hash = get_file_hash(temp_file_path)
+        async for chunk in source:
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"El archivo supera el máximo de {UPLOAD_MAX_BYTES} bytes")
+            # Mientras cabe en memoria se consume en el loop; una vez volcado, la escritura a disco va al threadpool
+            if buffer.spills(chunk):
+                await run_in_threadpool(consume, chunk)
+            else:
+                consume(chunk)
+    except OverflowError as e:
+        buffer.discard()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        # Cuerpo multipart mal formado
+        buffer.discard()
+        raise HTTPException(status_code=400, detail=f"Cuerpo multipart inválido: {e}")
+    except BaseException:
+        buffer.discard()
+        raise
+
+    if multipart is not None:
+        if not multipart.found:
+            buffer.discard()
+            raise HTTPException(status_code=400, detail="Falta el campo 'file' con el PDF")
+        nombre_archivo = multipart.filename or "documento.pdf"
+    if size == 0:
+        buffer.discard()
+        raise HTTPException(status_code=400, detail="El cuerpo de la petición está vacío")
+    return buffer.to_document(nombre_archivo, sha256_hash.hexdigest())
+
+def ingest_document(document: ParsedDocument, on_stage: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+    """
+    Pipeline síncrono de ingesta de un documento ya reservado en el índice de duplicados.
+    Se ejecuta siempre fuera del event loop (threadpool de FastAPI o pool de jobs).
+    Todo el pipeline trabaja sobre el ParsedDocument en memoria (sin archivo temporal intermedio).
+    Libera la reserva del hash y el documento al terminar.
+    """
+    file_hash = document.hash
+    try:
+        # 1. Clasificar (el texto/layout queda cacheado en el ParsedDocument)
+        first_page_text = extract_first_page_text(document)
+        classification = classify_document(first_page_text)
         
         collection_name = f"source_{classification.source.lower()}"
 
-        # 3. VERIFICAR DUPLICADOS EN QDRANT ANTES DE PROCESAR
+        # 2. VERIFICAR DUPLICADOS EN QDRANT ANTES DE PROCESAR
         if qdrant_manager.check_document_exists(collection_name, file_hash):
             raise HTTPException(
                 status_code=409, # 409 Conflict
                 detail=f"Documento con hash {file_hash[:10]}... ya existe en la colección '{collection_name}'."
             )
 
-        # 4. Subir a Azure Blob Storage (opcional pero recomendado como backup)
-        success, message = blob_storage.upload_file(temp_file_path, classification.source.lower())
+        # 3. Subir a Azure Blob Storage (opcional pero recomendado como backup)
+        success, message = blob_storage.upload_file(document, classification.source.lower())
         
         if not success:
             if "ya existe" in message:
-                logger.warning(f"Documento duplicado: {payload.name}")
+                logger.warning(f"Documento duplicado: {document.nombre_archivo}")
                 raise HTTPException(
                     status_code=409,
                     detail={
@@ -130,12 +271,14 @@ async def procesar_pdf(payload: PDFPayload) -> Dict[str, Any]:
                 )
             logger.error(f"Error al subir archivo: {message}")
             raise HTTPException(status_code=500, detail=message)
+        if on_stage:
+            on_stage("Almacenamiento", "SUCCESS")
 
-        # 5. Procesar el documento (solo si es nuevo)
+        # 4. Procesar el documento (solo si es nuevo)
         logger.info("Iniciando procesamiento del documento...")
-        resultados = process_pdf_automatically(temp_file_path, file_hash, qdrant_manager)
+        resultados = process_pdf_automatically(document, qdrant_manager, document_info=classification, on_stage=on_stage)
 
-        # 6. Preparar respuesta
+        # 5. Preparar respuesta
         response = {
             "estado": "éxito",
             "clasificacion": {
@@ -155,7 +298,7 @@ async def procesar_pdf(payload: PDFPayload) -> Dict[str, Any]:
         logger.info(f"Procesamiento completado. Respuesta: {json.dumps(sanitized_response, indent=2)}")
         
         # Devolvemos la RESPUESTA SANEADA, con el base64 ya truncado
-        return JSONResponse(content=sanitized_response, status_code=200)
+        return sanitized_response
 
     except HTTPException as he:
         # Re-lanzar excepciones HTTP
@@ -172,22 +315,72 @@ async def procesar_pdf(payload: PDFPayload) -> Dict[str, Any]:
         )
 
     finally:
-        # Limpiar archivo temporal
-        if temp_file_path:
-            await cleanup_temp_file(temp_file_path)
+        # Liberar la reserva del hash y el documento parseado (borra su archivo temporal si lo tiene)
+        hash_index.release(file_hash)
+        document.close()
+
+def submit_job(document: ParsedDocument) -> Dict[str, Any]:
+    """Encola la ingesta en el pool de jobs; si la cola está llena, libera la reserva y responde 503."""
+    try:
+        job = job_manager.submit(ingest_document, document.nombre_archivo, document.hash, document)
+    except JobQueueFullError as e:
+        hash_index.release(document.hash)
+        document.close()
+        raise HTTPException(status_code=503, detail=str(e))
+    estado = job.to_dict()
+    return {"job_id": estado["job_id"], "estado": estado["estado"], "hash": estado["hash"]}
+
+@app.post("/procesar_pdf")
+async def procesar_pdf(payload: PDFPayload) -> Dict[str, Any]:
+    # Base64, SHA-256 y el posible volcado a disco son bloqueantes: fuera del event loop
+    document = await run_in_threadpool(decode_and_claim, payload)
+    # El pipeline es bloqueante (PyPDF2, embeddings, OpenAI, psycopg2, Azure): se ejecuta en el threadpool
+    response = await run_in_threadpool(ingest_document, document)
+    return JSONResponse(content=response, status_code=200)
+
+@app.post("/procesar_pdf/stream")
+async def procesar_pdf_stream(request: Request) -> Dict[str, Any]:
+    """Igual que /procesar_pdf, pero recibe el PDF en binario (crudo o multipart) sin Base64."""
+    document = claim_document(await receive_streamed_pdf(request))
+    response = await run_in_threadpool(ingest_document, document)
+    return JSONResponse(content=response, status_code=200)
+
+@app.post("/jobs", status_code=202)
+async def crear_job(payload: PDFPayload) -> Dict[str, Any]:
+    """Encola la ingesta de un PDF y devuelve el id del job inmediatamente."""
+    return submit_job(await run_in_threadpool(decode_and_claim, payload))
+
+@app.post("/jobs/stream", status_code=202)
+async def crear_job_stream(request: Request) -> Dict[str, Any]:
+    """Encola la ingesta de un PDF recibido en binario (crudo o multipart)."""
+    return submit_job(claim_document(await receive_streamed_pdf(request)))
+
+@app.get("/jobs/{job_id}")
+async def consultar_job(job_id: str) -> Dict[str, Any]:
+    """Devuelve el estado y el progreso por etapa de un job de ingesta."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' no encontrado")
+    return job.to_dict()
 
 @app.get("/health")
 async def health_check():
-    """Endpoint para verificar el estado de la aplicación"""
+    """Endpoint para verificar el estado de la aplicación (liveness) y el progreso del warm-up (readiness)"""
     try:
-        # Verificar conexión a Blob Storage
-        if not blob_storage:
-            raise Exception("Blob Storage no inicializado")
-        
+        estado_warmup = warmup.snapshot()
+        if estado_warmup["estado"] == "failed":
+            # El probe de salud también relanza el warm-up; este chequeo sigue respondiendo 503
+            warmup.retry()
+            raise Exception(f"Warm-up falló: {estado_warmup['error']}")
+
         return {
             "status": "healthy",
+            "ready": estado_warmup["ready"],
             "timestamp": datetime.utcnow().isoformat(),
-            "blob_storage": "connected"
+            "warmup": estado_warmup,
+            "blob_storage": "connected" if blob_storage else "pending",
+            "llm_cache": llm_cache.stats(),
+            "llm_gateway": llm_gateway.stats()
         }
     except Exception as e:
         logger.error(f"Health check falló: {e}")
@@ -198,3 +391,15 @@ async def health_check():
                 "error": str(e)
             }
         )
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 solo cuando el warm-up terminó (modelo cargado, consultas precalculadas, pool de BD lleno)"""
+    estado_warmup = warmup.snapshot()
+    if not estado_warmup["ready"]:
+        return JSONResponse(
+            content=estado_warmup,
+            status_code=503,
+            headers={"Retry-After": str(WARMUP_RETRY_AFTER_SECONDS)},
+        )
+    return estado_warmup
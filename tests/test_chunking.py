@@ -0,0 +1,62 @@
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordPiece
+from tokenizers.pre_tokenizers import BertPreTokenizer
+
+from app.pipeline import chunking, tokens
+from app.pipeline.chunking import block_chunks, chunk_pages, token_windows
+
+
+@pytest.fixture(autouse=True)
+def tokenizer(monkeypatch):
+    # Sin red no se descarga tokenizer.json: un WordPiece sin vocabulario da un token por palabra/signo
+    monkeypatch.setattr(tokens, "_embedding_tokenizer", Tokenizer(WordPiece({"[UNK]": 0}, unk_token="[UNK]")))
+    tokens._embedding_tokenizer.pre_tokenizer = BertPreTokenizer()
+    monkeypatch.setattr(chunking, "EMBEDDING_MAX_SEQ_LENGTH", 256)
+
+
+def _words(n: int, prefix: str = "w") -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_short_text_is_a_single_chunk():
+    assert token_windows("  Iron ore  ", page=3) == [{"content": "Iron ore", "page": 3, "char_start": 0, "char_end": 12}]
+
+
+def test_windows_respect_size_overlap_and_offsets():
+    text = _words(10)
+    chunks = token_windows(text, page=1, base_offset=100, max_tokens=4, overlap=1)
+
+    assert [chunk["content"] for chunk in chunks] == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    for chunk in chunks:
+        assert text[chunk["char_start"] - 100:chunk["char_end"] - 100].strip() == chunk["content"]
+
+
+def test_windows_never_exceed_the_model_sequence_length(monkeypatch):
+    monkeypatch.setattr(chunking, "EMBEDDING_MAX_SEQ_LENGTH", 6)
+    chunks = token_windows(_words(20), page=1, max_tokens=240, overlap=0)
+    # 6 - [CLS] - [SEP] = 4 tokens por ventana
+    assert all(len(chunk["content"].split()) == 4 for chunk in chunks)
+    assert len(chunks) == 5
+
+
+def test_blocks_keep_paragraphs_and_table_rows_whole():
+    tabla = "\n".join(f"IODBZ00 12-Mar-24 10{i}.20" for i in range(3))  # 9 tokens por fila
+    text = "Titular corto\n\n" + tabla + "\n\nCierre"
+    chunks = block_chunks(text, page=2, max_tokens=12, overlap=0)
+
+    # La tabla no cabe entera: se parte en filas, que se agrupan con los bloques vecinos sin cortarse
+    assert [chunk["content"] for chunk in chunks] == [
+        "Titular corto\n\nIODBZ00 12-Mar-24 100.20",
+        "IODBZ00 12-Mar-24 101.20",
+        "IODBZ00 12-Mar-24 102.20\n\nCierre",
+    ]
+    for chunk in chunks:
+        assert text[chunk["char_start"]:chunk["char_end"]].strip() == chunk["content"]
+
+
+def test_chunk_pages_numbers_pages_and_skips_empty_ones():
+    chunks = chunk_pages(["uno", "", "dos tres"], strategy="tokens")
+    assert [(chunk["page"], chunk["content"]) for chunk in chunks] == [(1, "uno"), (3, "dos tres")]
+    with pytest.raises(ValueError):
+        chunk_pages(["uno"], strategy="desconocida")
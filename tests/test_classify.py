@@ -0,0 +1,52 @@
+from datetime import date
+
+import pytest
+
+from app.ai import classify
+from app.ai.classify import DocumentSource, classify_document, classify_with_rules
+
+
+@pytest.mark.parametrize("text, source, expected_date", [
+    ("Platts\nSteel Markets Daily\nVolume 17 / Issue 231 / November 28, 2024\nIron ore", "Platts", date(2024, 11, 28)),
+    ("S&P Global Commodity Insights\nSBB Steel Markets Daily\n2024-11-28\n", "Platts", date(2024, 11, 28)),
+    ("Fastmarkets Steel raw materials prices & news Daily\n28 Nov 2024\nIron ore", "FastMarkets", date(2024, 11, 28)),
+    ("Mysteel Weekly: China Iron Ore Inventory\nNov 29, 2024\nPort stocks", "Mysteel", date(2024, 11, 29)),
+    ("The Baltic Exchange\nCapesize Report\n12 March 2024\nC3 Tubarao to Qingdao", "Baltic", date(2024, 3, 12)),
+    ("Baltic Dry Index daily report - 12th March 2024\nBDI 2,150", "Baltic", date(2024, 3, 12)),
+    ("Baltic Capesize Index\n2024/03/12\nC5 W Australia to Qingdao", "Baltic", date(2024, 3, 12)),
+])
+def test_rules_classify_masthead_with_source_and_date(text, source, expected_date):
+    assert classify_with_rules(text) == DocumentSource(source=source, date=expected_date)
+
+
+def test_rules_ignore_dates_outside_the_masthead():
+    # Sin fecha en la cabecera: la de una noticia más abajo no sirve para clasificar
+    text = "Platts\nSteel Markets Daily\n" + "Iron ore prices edged higher. " * 40 + "\nContract signed on 1 January 2023."
+    assert classify_with_rules(text) is None
+
+
+def test_rules_require_a_single_source():
+    text = "Platts and Fastmarkets assessments compared\nNovember 28, 2024"
+    assert classify_with_rules(text) is None
+
+
+def test_rules_do_not_treat_other_baltic_mentions_as_the_exchange():
+    assert classify_with_rules("Baltic states steel demand outlook\nNovember 28, 2024") is None
+
+
+def test_ambiguous_dates_are_not_parsed():
+    # 03/12/2024 puede ser marzo o diciembre
+    assert classify_with_rules("Platts\nSteel Markets Daily\n03/12/2024") is None
+
+
+def test_classify_document_falls_back_to_llm_when_not_confident(monkeypatch):
+    llm_result = DocumentSource(source="Platts", date=date(2024, 11, 28))
+    calls = []
+    monkeypatch.setattr(classify, "classify_with_ai", lambda text: calls.append(text) or llm_result)
+
+    assert classify_document("Weekly market wrap without a masthead") == llm_result
+    assert len(calls) == 1
+
+    calls.clear()
+    assert classify_document("Platts\nNovember 28, 2024").source == "Platts"
+    assert calls == []
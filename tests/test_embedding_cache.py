@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services import embedding_cache as embedding_cache_module
+from app.services.embedding_cache import EmbeddingCache
+
+VECTOR_BYTES = 4 * 4  # float32 de dimensión 4
+
+
+@pytest.fixture(autouse=True)
+def reloj(monkeypatch):
+    ahora = iter(range(1_000, 100_000))
+    monkeypatch.setattr(embedding_cache_module, "time", SimpleNamespace(time=lambda: float(next(ahora))))
+
+
+def _cache(tmp_path, **kwargs):
+    return EmbeddingCache(path=str(tmp_path / "emb.sqlite3"), **{"max_entries": 100, "max_bytes": 10_000, "enabled": True, **kwargs})
+
+
+def _vector(valor: float) -> np.ndarray:
+    return np.full(4, valor, dtype=np.float32)
+
+
+def test_round_trip_by_model_and_text_hash(tmp_path):
+    cache = _cache(tmp_path)
+    h = EmbeddingCache.text_hash("Iron ore 62% Fe")
+    cache.put_many("minilm", {h: _vector(0.5)})
+
+    assert np.array_equal(cache.get_many("minilm", [h, h])[h], _vector(0.5))
+    assert cache.get_many("otro-modelo", [h]) == {}
+    assert cache.stats() == {"enabled": True, "hits": 1, "misses": 1, "entries": 1, "bytes": VECTOR_BYTES}
+
+
+def test_existing_vectors_are_not_counted_twice(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many("minilm", {"a": _vector(1)})
+    cache.put_many("minilm", {"a": _vector(2), "b": _vector(3)})
+
+    assert np.array_equal(cache.get_many("minilm", ["a"])["a"], _vector(1))
+    assert cache.stats()["entries"] == 2
+    assert _cache(tmp_path).get_many("minilm", ["a", "b"]).keys() == {"a", "b"}
+
+
+@pytest.mark.parametrize("limits", [{"max_entries": 2}, {"max_bytes": 2 * VECTOR_BYTES}])
+def test_evicts_least_recently_used(tmp_path, limits):
+    cache = _cache(tmp_path, **limits)
+    cache.put_many("minilm", {"a": _vector(1)})
+    cache.put_many("minilm", {"b": _vector(2)})
+    cache.get_many("minilm", ["a"])  # "b" pasa a ser el menos usado
+    cache.put_many("minilm", {"c": _vector(3)})
+
+    assert cache.get_many("minilm", ["a", "b", "c"]).keys() == {"a", "c"}
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 2 * VECTOR_BYTES
+
+
+def test_disabled_cache_is_a_no_op(tmp_path):
+    cache = _cache(tmp_path, enabled=False)
+    cache.put_many("minilm", {"a": _vector(1)})
+    assert cache.get_many("minilm", ["a"]) == {}
@@ -0,0 +1,91 @@
+from datetime import date
+
+import pytest
+
+from app.ai.extract_data import (
+    DatosBaltic, DatosFastmarkets, DatosPlatts, _document_lines, _price_after, extraer_precios_lineas,
+)
+from app.pipeline.document import ParsedDocument
+
+
+def _price(line: str, label: str, valid_range=(2, 400)):
+    return _price_after(line, line.index(label) + len(label), valid_range)
+
+
+@pytest.mark.parametrize("line, label, expected", [
+    ("IODBZ00 12 Mar 2024 105.20 +0.85", "IODBZ00", 105.20),
+    ("IODBZ00 12-Mar-24 105.20 -0.35", "IODBZ00", 105.20),
+    ("IODBZ00 12/03/2024 105.20", "IODBZ00", 105.20),
+    ("IOMGD00 Mar 12 2024 $104.75/dmt", "IOMGD00", 104.75),
+    ("C3 Tubarao to Qingdao 160,000 mt 24.565 +0.215", "Qingdao", 24.565),
+    ("MB-IRO-0009 Iron ore 65% Fe Brazil-origin fines, cfr Qingdao, $/tonne 115.80 115.20", "MB-IRO-0009", 115.80),
+])
+def test_price_skips_dates_quantities_and_grades(line, label, expected):
+    assert _price(line, label) == expected
+
+
+@pytest.mark.parametrize("line, label", [
+    # Solo la fecha: el día (12) no es un precio
+    ("IODBZ00 12 Mar 2024", "IODBZ00"),
+    # Ley del mineral, no precio
+    ("IODBZ00 Iron ore fines 60.8% Fe", "IODBZ00"),
+    # Un entero suelto no tiene formato de precio
+    ("C3 Tubarao to Qingdao route 14 days", "Qingdao"),
+    # El primer valor de la columna está fuera de rango: no se busca más a la derecha
+    ("IODBZ00 1,050.00 105.20", "IODBZ00"),
+])
+def test_price_rejects_non_price_tokens(line, label):
+    assert _price(line, label) is None
+
+
+def test_rules_extract_value_and_row_date():
+    pages = [[
+        "Platts Iron Ore Daily",
+        "Iron Ore Fines 62% Fe CFR North China IODBZ00 12-Mar-24 105.20 +0.85",
+        "IOMGD00 12-Mar-24 104.75 -0.10",
+    ]]
+    datos, confianza = extraer_precios_lineas(pages, DatosPlatts)
+    assert datos.precio_62_cfr_china.valor == 105.20
+    assert datos.precio_62_cfr_china.fecha == date(2024, 3, 12)
+    assert datos.precio_IOMGD00.valor == 104.75
+    # Un único voto por campo no alcanza FAST_PATH_MIN_CONFIDENCE: el LLM lo confirma
+    assert confianza == {"precio_62_cfr_china": 0.5, "precio_IOMGD00": 0.5}
+
+
+def test_rules_confidence_grows_with_agreeing_pages():
+    pages = [["C3 Tubarao to Qingdao 12 Mar 2024 24.565"]] * 3
+    _, confianza = extraer_precios_lineas(pages, DatosBaltic)
+    assert confianza["c3_tubarao_qingdao"] == 0.75
+
+
+def test_rules_leave_fields_without_row_date_to_the_llm():
+    datos, confianza = extraer_precios_lineas([["MB-IRO-0009 $/tonne 115.80"]], DatosFastmarkets)
+    assert datos.mb_iro_0009 is None
+    assert "mb_iro_0009" not in confianza
+
+
+def test_rules_confidence_reflects_disagreement_across_pages():
+    pages = [
+        ["C3 Tubarao to Qingdao 12 Mar 2024 24.565"],
+        ["C3 Tubarao to Qingdao 12 Mar 2024 23.900"],
+    ]
+    _, confianza = extraer_precios_lineas(pages, DatosBaltic)
+    assert confianza["c3_tubarao_qingdao"] == 0.33
+
+
+def test_text_and_layout_copies_of_a_row_vote_once():
+    import fitz
+
+    pdf = fitz.open()
+    page = pdf.new_page()
+    page.insert_text((72, 72), "IODBZ00   12-Mar-24   105.20")
+    document = ParsedDocument(pdf.tobytes(), "platts.pdf", text_engine="pymupdf")
+    try:
+        pages = _document_lines(document)
+        assert pages == [["IODBZ00 12-Mar-24 105.20"]]
+        # Un único voto: la copia del layout no cuenta como segunda página de acuerdo
+        datos, confianza = extraer_precios_lineas(pages, DatosPlatts)
+        assert datos.precio_62_cfr_china.valor == 105.20
+        assert confianza["precio_62_cfr_china"] == 0.5
+    finally:
+        document.close()
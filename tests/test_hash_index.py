@@ -0,0 +1,47 @@
+import threading
+
+from app.services.hash_index import HashIndex
+
+
+def test_claim_rejects_known_and_in_flight_hashes():
+    index = HashIndex()
+    assert index.warm(["conocido", "", None]) == 1
+    assert not index.claim("conocido")
+    assert index.claim("nuevo")
+    assert not index.claim("nuevo")
+    assert index.contains("nuevo")
+
+
+def test_release_allows_retrying_a_failed_document():
+    index = HashIndex()
+    assert index.claim("abc")
+    index.release("abc")
+    assert not index.contains("abc")
+    assert index.claim("abc")
+
+
+def test_added_hashes_stay_known_after_release():
+    index = HashIndex()
+    index.claim("abc")
+    index.add("abc")
+    index.release("abc")
+    assert not index.claim("abc")
+    assert len(index) == 1
+
+
+def test_only_one_concurrent_claim_wins():
+    index = HashIndex()
+    barrera = threading.Barrier(8)
+    ganadores = []
+
+    def reclamar():
+        barrera.wait()
+        if index.claim("mismo-pdf"):
+            ganadores.append(threading.current_thread().name)
+
+    hilos = [threading.Thread(target=reclamar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(ganadores) == 1
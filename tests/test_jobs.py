@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from app.pipeline.jobs import JobManager, JobQueueFullError
+
+
+class ErrorConDetalle(Exception):
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_pending=2, max_retained=2)
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def _esperar(*jobs):
+    deadline = time.monotonic() + 5
+    while not all(job.terminado for job in jobs):
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_job_records_stages_and_result(manager):
+    def ingesta(documento, on_stage):
+        on_stage("Clasificación", "SUCCESS")
+        on_stage("Indexación Qdrant", "SUCCESS")
+        return {"documento": documento}
+
+    job = manager.submit(ingesta, "reporte.pdf", "abc", "reporte")
+    _esperar(job)
+
+    estado = manager.get(job.id).to_dict()
+    assert estado["estado"] == "COMPLETADO"
+    assert estado["resultado"] == {"documento": "reporte"}
+    assert [etapa["etapa"] for etapa in estado["etapas"]] == ["Clasificación", "Indexación Qdrant"]
+    assert estado["inicio"] and estado["fin"]
+
+
+def test_job_keeps_the_error_detail(manager):
+    def ingesta(on_stage):
+        raise ErrorConDetalle({"mensaje": "duplicado"})
+
+    job = manager.submit(ingesta, "reporte.pdf", "abc")
+    _esperar(job)
+    assert job.to_dict()["estado"] == "ERROR"
+    assert job.to_dict()["error"] == {"mensaje": "duplicado"}
+
+
+def test_submit_rejects_when_too_many_jobs_are_pending(manager):
+    liberar = threading.Event()
+
+    def ingesta(on_stage):
+        liberar.wait(5)
+
+    manager.submit(ingesta, "a.pdf", "a")
+    manager.submit(ingesta, "b.pdf", "b")
+    with pytest.raises(JobQueueFullError):
+        manager.submit(ingesta, "c.pdf", "c")
+    liberar.set()
+
+
+def test_only_finished_jobs_are_evicted():
+    manager = JobManager(max_workers=1, max_pending=10, max_retained=2)
+    liberar = threading.Event()
+    primeros = [manager.submit(lambda on_stage: None, f"{i}.pdf", str(i)) for i in range(2)]
+    _esperar(*primeros)
+
+    en_curso = manager.submit(lambda on_stage: liberar.wait(5), "lento.pdf", "lento")
+    nuevo = manager.submit(lambda on_stage: None, "nuevo.pdf", "nuevo")
+    liberar.set()
+
+    assert manager.get(primeros[0].id) is None
+    assert manager.get(en_curso.id) is en_curso
+    assert manager.get(nuevo.id) is nuevo
+    manager.shutdown(wait=True)
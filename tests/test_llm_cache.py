@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from app.ai import llm_cache as llm_cache_module
+from app.ai.llm_cache import LLMCache
+
+
+class Resultado(BaseModel):
+    valor: float
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1_000.0
+
+    def time(self):
+        self.ahora += 1
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(llm_cache_module, "time", SimpleNamespace(time=reloj.time))
+    return reloj
+
+
+def _cache(tmp_path, **kwargs):
+    return LLMCache(path=str(tmp_path / "cache" / "llm.sqlite3"), **{"max_bytes": 10_000, "ttl_seconds": 3600, "enabled": True, **kwargs})
+
+
+def test_key_depends_on_model_schema_and_messages():
+    messages = [{"role": "user", "content": "precio"}]
+    key = LLMCache.make_key("gpt", Resultado, messages)
+    assert key == LLMCache.make_key("gpt", Resultado, [dict(m) for m in messages])
+    assert key != LLMCache.make_key("otro", Resultado, messages)
+    assert key != LLMCache.make_key("gpt", Resultado, [{"role": "user", "content": "otro"}])
+
+
+def test_round_trip_and_stats(tmp_path, reloj):
+    cache = _cache(tmp_path)
+    assert cache.get("k", Resultado) is None
+    cache.set("k", "gpt", Resultado(valor=105.2))
+    assert cache.get("k", Resultado) == Resultado(valor=105.2)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["bytes"] == len(Resultado(valor=105.2).model_dump_json())
+
+
+def test_expired_entries_are_misses(tmp_path, reloj):
+    cache = _cache(tmp_path, ttl_seconds=10)
+    cache.set("k", "gpt", Resultado(valor=1))
+    reloj.ahora += 60
+    assert cache.get("k", Resultado) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_evicts_least_recently_used_over_max_bytes(tmp_path, reloj):
+    size = len(Resultado(valor=1).model_dump_json())
+    cache = _cache(tmp_path, max_bytes=2 * size)
+    cache.set("a", "gpt", Resultado(valor=1))
+    cache.set("b", "gpt", Resultado(valor=2))
+    cache.get("a", Resultado)  # "b" pasa a ser la menos usada
+    cache.set("c", "gpt", Resultado(valor=3))
+
+    assert cache.get("b", Resultado) is None
+    assert cache.get("a", Resultado) == Resultado(valor=1)
+    assert cache.get("c", Resultado) == Resultado(valor=3)
+    assert cache.stats()["bytes"] == 2 * size
+
+
+def test_total_size_survives_reopening(tmp_path, reloj):
+    cache = _cache(tmp_path)
+    cache.set("k", "gpt", Resultado(valor=1))
+    cache.set("k", "gpt", Resultado(valor=22))  # reemplazo: no se cuenta dos veces
+    reabierta = _cache(tmp_path)
+    assert reabierta.get("k", Resultado) == Resultado(valor=22)
+    assert reabierta.stats()["bytes"] == cache.stats()["bytes"] == len(Resultado(valor=22).model_dump_json())
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from app.ai import llm_gateway as gateway_module
+from app.ai.llm_gateway import LLMGateway, TokenBucket
+
+
+class Respuesta(BaseModel):
+    texto: str
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    async def create_with_completion(self, *, model, response_model, messages, **kwargs):
+        self.calls.append(messages[0]["content"])
+        if messages[0]["content"] == "bloquea":
+            while not self.release.is_set():
+                await asyncio.sleep(0.01)
+        return response_model(texto=messages[0]["content"]), SimpleNamespace(usage=None)
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    import instructor
+
+    completions = FakeCompletions()
+    monkeypatch.setattr(gateway_module, "OPENAI_API_KEY", "sk-test")
+    # Sin red no se puede descargar el encoding de tiktoken: basta una estimación cualquiera
+    monkeypatch.setattr(gateway_module, "count_tokens", len)
+    monkeypatch.setattr(instructor, "from_openai", lambda client: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    gw = LLMGateway(requests_per_minute=600, tokens_per_minute=1_000_000, max_concurrency=1)
+    gw.start()
+    yield gw, completions
+    completions.release.set()
+    gw.close()
+
+
+def _messages(content: str):
+    return [{"role": "user", "content": content}]
+
+
+def test_token_bucket_waits_and_refills():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    # 1 unidad por segundo: faltan ~30 s para 30 unidades
+    assert 29 < bucket.wait_time(30) <= 30
+    bucket.refund(30)
+    assert bucket.wait_time(30) == 0
+
+
+def test_token_bucket_caps_requests_larger_than_capacity():
+    bucket = TokenBucket(per_minute=10)
+    assert bucket.wait_time(1000) == 0
+
+
+def test_complete_returns_the_validated_model(gateway):
+    gw, completions = gateway
+    assert gw.complete(model="m", response_model=Respuesta, messages=_messages("hola")) == Respuesta(texto="hola")
+    assert completions.calls == ["hola"]
+
+
+def test_timed_out_requests_are_not_dispatched(gateway):
+    gw, completions = gateway
+    bloqueada = gw.submit(model="m", response_model=Respuesta, messages=_messages("bloquea"))
+    # Con la única plaza ocupada, las siguientes no llegan a despacharse antes del timeout
+    for content in ("tarde-1", "tarde-2"):
+        with pytest.raises(TimeoutError):
+            gw.complete(model="m", response_model=Respuesta, messages=_messages(content), result_timeout=0.05)
+
+    completions.release.set()
+    assert bloqueada.result(timeout=5) == Respuesta(texto="bloquea")
+    assert gw.complete(model="m", response_model=Respuesta, messages=_messages("viva"), result_timeout=5) == Respuesta(texto="viva")
+    assert completions.calls == ["bloquea", "viva"]
+    assert gw.stats()["dropped"] == 2
+
+
+def test_close_fails_pending_requests(gateway):
+    gw, _ = gateway
+    bloqueada = gw.submit(model="m", response_model=Respuesta, messages=_messages("bloquea"))
+    encolada = gw.submit(model="m", response_model=Respuesta, messages=_messages("encolada"))
+    gw.close()
+    for future in (bloqueada, encolada):
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
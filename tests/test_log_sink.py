@@ -0,0 +1,52 @@
+import threading
+import time
+
+from app.services.log_sink import LogSink
+
+
+class Writer:
+    def __init__(self, ok: bool = True):
+        self.ok = ok
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, tabla, rows):
+        with self.lock:
+            self.batches.append((tabla, list(rows)))
+        return self.ok
+
+
+def test_flush_groups_rows_by_table():
+    writer = Writer()
+    sink = LogSink(writer, max_size=10, batch_size=10, flush_interval=60)
+    sink.enqueue("logs_tareas", (1,))
+    sink.enqueue("logs_procesamiento", (2,))
+    sink.enqueue("logs_tareas", (3,))
+    sink.close()
+
+    assert sorted(writer.batches) == [("logs_procesamiento", [(2,)]), ("logs_tareas", [(1,), (3,)])]
+    assert sink.written == 3 and sink.dropped == 0
+
+
+def test_background_thread_writes_full_batches():
+    writer = Writer()
+    sink = LogSink(writer, max_size=100, batch_size=2, flush_interval=60)
+    sink.enqueue("logs_tareas", (1,))
+    sink.enqueue("logs_tareas", (2,))
+    deadline = time.monotonic() + 5
+    while sink.written < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.written == 2
+    sink.close()
+
+
+def test_full_queue_and_failed_writes_are_counted_as_dropped():
+    writer = Writer(ok=False)
+    sink = LogSink(writer, max_size=2, batch_size=100, flush_interval=60)
+    for i in range(3):
+        sink.enqueue("logs_tareas", (i,))
+    sink.close()
+
+    # Uno no cabe en la cola y los otros dos fallan al escribirse
+    assert sink.dropped == 3
+    assert sink.written == 0
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import main
+from app.pipeline.document import SpillBuffer
+from app.services.multipart_stream import MultipartFileStream
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 64 + b"\n%%EOF"
+BOUNDARY = "----limite"
+
+
+def _multipart(filename: str = "reporte.pdf", content_type: str = "application/pdf", field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"comentario\"\r\n\r\nhola\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8") + PDF + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _body(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _collect(stream: MultipartFileStream, data: bytes, size: int = 7, max_body_bytes=None) -> bytes:
+    async def run():
+        return b"".join([chunk async for chunk in stream.iter_file(_body(data, size), max_body_bytes)])
+    return asyncio.run(run())
+
+
+def test_stream_extracts_only_the_file_field():
+    stream = MultipartFileStream(f"multipart/form-data; boundary={BOUNDARY}")
+    assert _collect(stream, _multipart(filename="Informe año.pdf")) == PDF
+    assert stream.found
+    assert stream.filename == "Informe año.pdf"
+    assert stream.content_type == "application/pdf"
+
+
+def test_stream_without_file_field():
+    stream = MultipartFileStream(f"multipart/form-data; boundary={BOUNDARY}")
+    assert _collect(stream, _multipart(field="otro")) == b""
+    assert not stream.found
+
+
+def test_stream_enforces_the_body_limit():
+    stream = MultipartFileStream(f"multipart/form-data; boundary={BOUNDARY}")
+    with pytest.raises(OverflowError):
+        _collect(stream, _multipart(), size=1024, max_body_bytes=1000)
+
+
+def test_stream_requires_a_boundary():
+    with pytest.raises(ValueError):
+        MultipartFileStream("multipart/form-data")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "require_ready", lambda: None)
+    # Umbral mínimo para ejercitar también el volcado a disco
+    monkeypatch.setattr(main, "SpillBuffer", lambda: SpillBuffer(threshold=1024))
+    app = FastAPI()
+
+    @app.post("/subir")
+    async def subir(request: Request):
+        document = await main.receive_streamed_pdf(request)
+        try:
+            with document.open_stream() as f:
+                contenido = f.read()
+            return {"nombre": document.nombre_archivo, "hash": document.hash, "en_disco": document.path is not None,
+                    "igual": contenido == PDF}
+        finally:
+            document.close()
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("content_type", ["application/pdf", "application/octet-stream"])
+def test_endpoint_accepts_multipart_pdf_parts(client, content_type):
+    response = client.post("/subir", content=_multipart(content_type=content_type),
+                           headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+    assert response.status_code == 200
+    assert response.json() == {"nombre": "reporte.pdf", "hash": hashlib.sha256(PDF).hexdigest(), "en_disco": True, "igual": True}
+
+
+def test_endpoint_accepts_raw_octet_stream(client):
+    response = client.post("/subir", content=PDF, headers={"content-type": "application/octet-stream", "x-file-name": "crudo.pdf"})
+    assert response.json()["nombre"] == "crudo.pdf"
+    assert response.json()["igual"]
+
+
+def test_endpoint_rejects_non_pdf_parts(client):
+    response = client.post("/subir", content=_multipart(content_type="text/plain"),
+                           headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+    assert response.status_code == 400
+
+
+def test_endpoint_rejects_oversized_uploads(client, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_BYTES", 1000)
+    response = client.post("/subir", content=PDF, headers={"content-type": "application/pdf"})
+    assert response.status_code == 413
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.pipeline import task
+from app.pipeline.task import relocate_points, reusable_pages
+
+
+def _point(page: int, content: str, char_start: int, vector=(0.1, 0.2)):
+    payload = {"page": page, "content": content, "char_start": char_start, "char_end": char_start + len(content)}
+    return SimpleNamespace(payload=payload, vector=list(vector))
+
+
+class FakeDocument:
+    def __init__(self, pages: list[str]):
+        self.pages = pages
+
+    def page_text(self, page_num: int) -> str:
+        return self.pages[page_num]
+
+
+class FakeQdrant:
+    def __init__(self, points: list):
+        self.points = points
+        self.requested_pages = None
+
+    def get_page_points(self, collection_name, doc_hash, pages, index_version):
+        self.requested_pages = pages
+        return [point for point in self.points if point.payload["page"] in pages]
+
+
+@pytest.fixture
+def base_document(monkeypatch):
+    base = {"documento_id": 7, "hash_documento": "base-hash", "paginas": {"fp-a": 1, "fp-b": 2, "fp-vacia": 3}}
+    monkeypatch.setattr(task, "PAGE_DELTA_ENABLED", True)
+    monkeypatch.setattr(task.db_manager, "get_previous_page_hashes", lambda fuente, document_id: base)
+    return base
+
+
+def test_relocate_points_keeps_offsets_when_text_is_identical():
+    text = "Iron ore 62% Fe fines\nIODBZ00 105.20"
+    chunks = relocate_points(text, 4, [_point(1, "IODBZ00 105.20", 22), _point(1, "Iron ore 62% Fe fines", 0)])
+
+    assert [chunk for chunk, _ in chunks] == [
+        {"content": "Iron ore 62% Fe fines", "page": 4, "char_start": 0, "char_end": 21},
+        {"content": "IODBZ00 105.20", "page": 4, "char_start": 22, "char_end": 36},
+    ]
+    assert all(vector == [0.1, 0.2] for _, vector in chunks)
+
+
+def test_relocate_points_recomputes_offsets_when_only_whitespace_changes():
+    # Misma huella normalizada, pero el texto crudo de la página nueva tiene otros espacios
+    text = "  Iron ore   62% Fe\n fines\n\nIODBZ00  105.20"
+    chunks = relocate_points(text, 2, [_point(1, "Iron ore 62% Fe fines", 0), _point(1, "IODBZ00 105.20", 22)])
+
+    for chunk, _ in chunks:
+        assert text[chunk["char_start"]:chunk["char_end"]] == chunk["content"]
+    assert [chunk["content"] for chunk, _ in chunks] == ["Iron ore   62% Fe\n fines", "IODBZ00  105.20"]
+
+
+def test_relocate_points_gives_up_when_a_chunk_is_missing():
+    assert relocate_points("Iron ore 62% Fe fines", 1, [_point(1, "IODBZ00 105.20", 0)]) is None
+
+
+def test_reusable_pages_reuses_matching_pages_with_new_numbering(base_document):
+    document = FakeDocument(["Portada nueva", "Iron ore 62% Fe fines", "   "])
+    qdrant = FakeQdrant([_point(1, "Portada vieja", 0), _point(2, "Iron ore 62% Fe fines", 0)])
+
+    base, paginas, reutilizados = reusable_pages(
+        document, ["fp-nueva", "fp-b", "fp-vacia"], 8, "Platts", "source_platts", "v1", qdrant
+    )
+
+    assert base is base_document
+    assert qdrant.requested_pages == [2, 3]
+    # La página 3 está vacía: se omite aunque no tenga puntos
+    assert paginas == {2: 2, 3: 3}
+    assert [chunk for chunk, _ in reutilizados] == [
+        {"content": "Iron ore 62% Fe fines", "page": 2, "char_start": 0, "char_end": 21},
+    ]
+
+
+def test_reusable_pages_reprocesses_pages_without_points_or_relocatable_chunks(base_document):
+    document = FakeDocument(["Texto con puntos distintos", "Página sin puntos en Qdrant"])
+    qdrant = FakeQdrant([_point(1, "Contenido que ya no aparece", 0)])
+
+    _, paginas, reutilizados = reusable_pages(document, ["fp-a", "fp-b"], 8, "Platts", "source_platts", "v1", qdrant)
+
+    assert paginas == {}
+    assert reutilizados == []
+
+
+def test_reusable_pages_without_base_document(monkeypatch):
+    monkeypatch.setattr(task, "PAGE_DELTA_ENABLED", True)
+    monkeypatch.setattr(task.db_manager, "get_previous_page_hashes", lambda fuente, document_id: None)
+
+    assert reusable_pages(FakeDocument(["x"]), ["fp"], 8, "Platts", "source_platts", "v1", FakeQdrant([])) == (None, {}, [])
@@ -0,0 +1,77 @@
+from datetime import date
+
+import pytest
+
+from app.ai.classify import DocumentSource
+from app.ai.extract_data import DatosBaltic, PrecioConFecha, ResultadoReglas
+from app.pipeline import task
+
+
+class FakeDocument:
+    hash = "doc-hash"
+
+
+class FakeQdrant:
+    def search_batch(self, collection_name, queries, doc_hash=None):
+        return [{"content": "C3 Tubarao to Qingdao 12 Mar 2024 24.565", "score": 0.9}]
+
+
+PRECIO = PrecioConFecha(valor=24.565, fecha=date(2024, 3, 12))
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    logs = []
+    llamadas = []
+
+    def llm(contexto):
+        llamadas.append(contexto)
+        return DatosBaltic(c3_tubarao_qingdao=PRECIO)
+
+    monkeypatch.setattr(task.db_manager, "log_tarea", lambda **kwargs: logs.append(kwargs))
+    monkeypatch.setattr(task, "build_context", lambda results, max_tokens: ("contexto", {"chunks_contexto": len(results)}))
+    monkeypatch.setitem(task.TASK_REGISTRY, "get_baltic_prices", {
+        **task.TASK_REGISTRY["get_baltic_prices"], "extractor_func": llm,
+    })
+    return logs, llamadas
+
+
+def _run():
+    info = DocumentSource(source="Baltic", date=date(2024, 3, 12))
+    return task.run_task(1, info, "get_baltic_prices", FakeQdrant(), FakeDocument())
+
+
+def test_failing_rules_fall_back_to_the_llm(registro, monkeypatch):
+    logs, llamadas = registro
+
+    def reglas_rotas(document):
+        raise RuntimeError("layout inesperado")
+
+    monkeypatch.setitem(task.TASK_REGISTRY["get_baltic_prices"], "fast_extractor", reglas_rotas)
+
+    assert _run() == DatosBaltic(c3_tubarao_qingdao=PRECIO)
+    assert llamadas == ["contexto"]
+    assert logs[0]["estado"] == "SUCCESS"
+    assert logs[0]["detalles"]["via"] == "llm"
+    assert logs[0]["detalles"]["error_reglas"] == "layout inesperado"
+    assert logs[0]["detalles"]["campos_llm"] == ["c3_tubarao_qingdao"]
+
+
+def test_confident_rules_skip_the_llm(registro, monkeypatch):
+    logs, llamadas = registro
+    monkeypatch.setitem(task.TASK_REGISTRY["get_baltic_prices"], "fast_extractor",
+                        lambda document: ResultadoReglas(DatosBaltic(c3_tubarao_qingdao=PRECIO), {"c3_tubarao_qingdao": 0.75}))
+
+    assert _run() == DatosBaltic(c3_tubarao_qingdao=PRECIO)
+    assert llamadas == []
+    assert logs[0]["detalles"]["via"] == "reglas"
+
+
+def test_low_confidence_rules_defer_to_the_llm(registro, monkeypatch):
+    logs, llamadas = registro
+    monkeypatch.setitem(task.TASK_REGISTRY["get_baltic_prices"], "fast_extractor",
+                        lambda document: ResultadoReglas(DatosBaltic(c3_tubarao_qingdao=PRECIO), {"c3_tubarao_qingdao": 0.5}))
+
+    _run()
+    assert llamadas == ["contexto"]
+    assert logs[0]["detalles"]["campos_llm"] == ["c3_tubarao_qingdao"]
@@ -0,0 +1,27 @@
+import fitz
+
+from app.pipeline.document import ParsedDocument
+from app.pipeline.text_engines import PyMuPDFEngine, _split_ranges
+
+
+def _pdf(pages: int) -> bytes:
+    pdf = fitz.open()
+    for i in range(pages):
+        pdf.new_page().insert_text((72, 72), f"Página {i + 1}")
+    return pdf.tobytes()
+
+
+def test_split_ranges_covers_every_page():
+    assert _split_ranges(10, 3) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_parallel_extraction_matches_sequential():
+    document = ParsedDocument(_pdf(6), "reporte.pdf", text_engine="pymupdf")
+    engine = PyMuPDFEngine(parallel_workers=2, parallel_min_pages=2)
+    try:
+        esperado = PyMuPDFEngine(parallel_workers=1).extract_pages(document)
+        assert engine.extract_pages(document) == esperado == [f"Página {i + 1}" for i in range(6)]
+        assert engine._pool._mp_context.get_start_method() == "forkserver"
+    finally:
+        engine.shutdown()
+        document.close()